@@ -0,0 +1,168 @@
+"""Headless batch processing of many account exports, without Streamlit.
+
+Run with: python batch.py INPUT_DIR OUTPUT_DIR [--workers N] [--format parquet|json] [--local-only]
+
+Every file directly in INPUT_DIR is one account, named after the file.
+Every subdirectory is also one account, merging all the files inside
+it. CSV files are read as Wealthsimple CSV exports and anything else
+(.txt) as an activity paste. Each account is parsed and analysed on a
+process pool and written to OUTPUT_DIR/<account>/:
+
+- transactions: the ledger, with the realized P&L of each trade
+- holdings: open positions with their FIFO cost basis
+- metrics.json: portfolio metrics and realized P&L per security
+
+OUTPUT_DIR/summary.json reports throughput and every failed account.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.data_parser import WealthSimpleParser
+from utils.ledger import Ledger
+from utils.positions import realized_pnl
+
+INPUT_EXTENSIONS = ('.csv', '.txt')
+
+# One parser per worker process, created by the pool initializer
+_parser = None
+
+
+def _init_worker():
+    global _parser
+    _parser = WealthSimpleParser()
+
+
+def find_accounts(input_dir):
+    """Map of account name to the input files that make it up"""
+    accounts = {}
+    for entry in sorted(os.scandir(input_dir), key=lambda entry: entry.name):
+        if entry.is_dir():
+            files = sorted(
+                os.path.join(entry.path, name) for name in os.listdir(entry.path)
+                if name.lower().endswith(INPUT_EXTENSIONS)
+            )
+            if files:
+                accounts[entry.name] = files
+        elif entry.name.lower().endswith(INPUT_EXTENSIONS):
+            accounts[os.path.splitext(entry.name)[0]] = [entry.path]
+    return accounts
+
+
+def write_frame(df, path, output_format):
+    if output_format == 'parquet':
+        df.to_parquet(path + '.parquet', index=False)
+    else:
+        df.to_json(path + '.jsonl', orient='records', lines=True, date_format='iso')
+
+
+def process_account(account, files, output_dir, output_format, use_api):
+    """Parse and analyse one account and write its results. Runs in a worker process."""
+    start = time.perf_counter()
+    ledger = Ledger()
+    skipped = 0
+    for path in files:
+        if path.lower().endswith('.csv'):
+            _parser.append_csv_export(path, ledger)
+        else:
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+            if not use_api:
+                skipped += len(_parser.parse_local(text)[1])
+            _parser.append(text, ledger, use_api=use_api)
+
+    if len(ledger) == 0:
+        raise ValueError("No transactions found in the input")
+
+    pnl = realized_pnl(ledger.df)
+    account_dir = os.path.join(output_dir, account)
+    os.makedirs(account_dir, exist_ok=True)
+    write_frame(pnl.trades, os.path.join(account_dir, 'transactions'), output_format)
+    write_frame(ledger.positions().holdings(), os.path.join(account_dir, 'holdings'), output_format)
+
+    metrics = {
+        # numpy scalars to plain numbers for JSON
+        **{key: value.item() if hasattr(value, 'item') else value for key, value in ledger.metrics.items()},
+        'realized_pl': float(pnl.by_security.sum()),
+        'realized_pl_by_security': {str(key): float(value) for key, value in pnl.by_security.items()},
+        'unrecognized_blocks_skipped': skipped,
+    }
+    with open(os.path.join(account_dir, 'metrics.json'), 'w') as f:
+        json.dump(metrics, f, indent=2)
+
+    return {'transactions': len(ledger), 'skipped_blocks': skipped, 'seconds': time.perf_counter() - start}
+
+
+def run(input_dir, output_dir, workers=None, output_format='parquet', use_api=True):
+    """Process every account under input_dir and return the summary"""
+    accounts = find_accounts(input_dir)
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    results = {}
+    failures = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {
+            pool.submit(process_account, account, files, output_dir, output_format, use_api): account
+            for account, files in accounts.items()
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            account = futures[future]
+            try:
+                results[account] = future.result()
+            except Exception as e:
+                print(f"Error processing {account}: {str(e)}", file=sys.stderr)
+                failures[account] = str(e)
+            if done % 100 == 0 or done == len(futures):
+                print(f"{done}/{len(futures)} accounts processed", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    transactions = sum(result['transactions'] for result in results.values())
+    summary = {
+        'accounts': len(accounts),
+        'succeeded': len(results),
+        'failed': len(failures),
+        'transactions': transactions,
+        'skipped_blocks': sum(result['skipped_blocks'] for result in results.values()),
+        'workers': workers,
+        'format': output_format,
+        'seconds': round(elapsed, 3),
+        'accounts_per_second': round(len(accounts) / elapsed, 2) if elapsed else None,
+        'transactions_per_second': round(transactions / elapsed) if elapsed else None,
+        'failures': failures,
+    }
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('input_dir', help='directory of exports, one file or subdirectory per account')
+    arg_parser.add_argument('output_dir')
+    arg_parser.add_argument('--workers', type=int, help='worker processes (default: all cores)')
+    arg_parser.add_argument('--format', choices=['parquet', 'json'], default='parquet',
+                            help='output format for the per-account tables')
+    arg_parser.add_argument('--local-only', action='store_true',
+                            help='never call DeepSeek; skip paste blocks the local parser does not recognize')
+    args = arg_parser.parse_args(argv)
+
+    output_format = args.format
+    if output_format == 'parquet' and not any(
+        importlib.util.find_spec(engine) for engine in ('pyarrow', 'fastparquet')
+    ):
+        print("Parquet output needs pyarrow or fastparquet, writing JSON lines instead", file=sys.stderr)
+        output_format = 'json'
+
+    summary = run(args.input_dir, args.output_dir, args.workers, output_format, not args.local_only)
+    print(json.dumps({key: value for key, value in summary.items() if key != 'failures'}))
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
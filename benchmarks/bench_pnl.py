@@ -0,0 +1,39 @@
+"""Benchmark the FIFO realized P&L engine on a large synthetic ledger.
+
+Run with: python -m benchmarks.bench_pnl [num_trades]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.pnl import calculate_realized_pnl
+
+
+def make_trades(num_trades, num_securities=500, seed=0):
+    """Random BUY/SELL ledger spread over a few years"""
+    rng = np.random.default_rng(seed)
+    tickers = np.array([f"T{i:04d}" for i in range(num_securities)])
+    return pd.DataFrame({
+        'date': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 5 * 365, num_trades), unit='D'),
+        'security': tickers[rng.integers(0, num_securities, num_trades)],
+        'transaction_type': np.where(rng.random(num_trades) < 0.55, 'BUY', 'SELL'),
+        'amount': rng.uniform(10, 5000, num_trades).round(2),
+    })
+
+
+def main(num_trades=1_000_000):
+    df = make_trades(num_trades)
+
+    start = time.perf_counter()
+    result = calculate_realized_pnl(df)
+    elapsed = time.perf_counter() - start
+
+    print(f"trades: {num_trades:,}")
+    print(f"securities: {len(result.by_security):,}")
+    print(f"elapsed: {elapsed:.2f}s ({num_trades / elapsed:,.0f} trades/s)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
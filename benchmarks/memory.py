@@ -0,0 +1,137 @@
+"""Memory benchmark: bytes per transaction of the ledger and of a session.
+
+Run with: python -m benchmarks.memory --sizes 1000,10000,100000 --output results.jsonl
+
+For each size a ledger is built from a synthetic CSV export and measured
+with Ledger.memory_usage(), which counts the frame and the identity
+fingerprints every ledger keeps resident. The canonical layout is
+compared with what the ledger held before: plain text columns (string
+dates, tickers and sides) and its fingerprints as a set of hex strings.
+The session figure adds what a session keeps besides the ledger:
+formerly a copy of the frame and the whole ledger as CSV text, now
+nothing. Results are JSON lines, like benchmarks.run.
+
+--sessions N also opens N sessions, each with its own ledger, in a
+SessionDataStore with a --budget byte budget and reports how much stays
+in memory and how long reloading a spilled ledger takes.
+"""
+import argparse
+import io
+import json
+import sys
+import tempfile
+import time
+
+from benchmarks.run import git_revision
+from benchmarks.synthetic import generate_transactions, to_csv_export
+from utils.data_parser import WealthSimpleParser
+from utils.ledger import Ledger
+from utils.schema import CATEGORY_COLUMNS
+from utils.session_store import SessionDataStore
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def text_layout(df):
+    """The ledger frame with the plain string columns it had before the canonical schema"""
+    return df.astype({column: str for column in CATEGORY_COLUMNS + ['transaction_type']}).assign(
+        date=df['date'].dt.strftime('%Y-%m-%d')
+    )
+
+
+def fingerprint_set_bytes(fingerprints):
+    """Bytes of the fingerprints as a set of hex strings, how the ledger used to keep them"""
+    as_set = set(fingerprints)
+    return sys.getsizeof(as_set) + sum(sys.getsizeof(fingerprint) for fingerprint in as_set)
+
+
+def measure(num_transactions):
+    export = to_csv_export(generate_transactions(num_transactions))
+    parser = WealthSimpleParser()
+    ledger = Ledger()
+    parser.append_csv_export(io.StringIO(export), ledger)
+    rows = len(ledger)
+    _, fingerprints = parser.read_csv_export(io.StringIO(export))
+
+    compact = ledger.memory_usage()
+    text = frame_bytes(text_layout(ledger.df)) + fingerprint_set_bytes(fingerprints)
+    csv_text = len(ledger.to_csv().encode())
+    return rows, {
+        'canonical': {'ledger': compact, 'session': compact},
+        'text': {'ledger': text, 'session': text + frame_bytes(text_layout(ledger.df)) + csv_text},
+    }
+
+
+def measure_sessions(num_sessions, num_transactions, budget):
+    """Open num_sessions sessions with distinct ledgers in a budgeted store"""
+    export = to_csv_export(generate_transactions(num_transactions))
+    parser = WealthSimpleParser()
+    with tempfile.TemporaryDirectory() as directory:
+        store = SessionDataStore(directory, max_bytes=budget)
+        total = 0
+        for session in range(num_sessions):
+            ledger = Ledger()
+            # Unsaved ledgers (no ledger id) are never shared between sessions
+            parser.append_csv_export(io.StringIO(export), ledger)
+            total += ledger.memory_usage()
+            store.set(f"session-{session}", 'ledger', ledger)
+            del ledger
+
+        start = time.perf_counter()
+        store.get('session-0', 'ledger')
+        reload_seconds = time.perf_counter() - start
+        return total, store.memory_usage(), reload_seconds
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='comma-separated ledger sizes (transactions)')
+    arg_parser.add_argument('--sessions', type=int, default=0,
+                            help='also simulate this many concurrent sessions')
+    arg_parser.add_argument('--session-transactions', type=int, default=10000)
+    arg_parser.add_argument('--budget', type=int, default=64 * 1024 * 1024,
+                            help='session store memory budget in bytes')
+    arg_parser.add_argument('--output', help='append JSON lines here instead of stdout')
+    args = arg_parser.parse_args(argv)
+
+    output = open(args.output, 'a') if args.output else sys.stdout
+    revision = git_revision()
+    try:
+        for size in [int(value) for value in args.sizes.split(',')]:
+            rows, layouts = measure(size)
+            for layout, measured in layouts.items():
+                for scope, total in measured.items():
+                    result = {
+                        'benchmark': f'memory.{scope}',
+                        'layout': layout,
+                        'rows': rows,
+                        'bytes': total,
+                        'bytes_per_transaction': round(total / rows, 1),
+                        'revision': revision,
+                    }
+                    output.write(json.dumps(result) + '\n')
+                    output.flush()
+
+        if args.sessions:
+            total, resident, reload_seconds = measure_sessions(args.sessions, args.session_transactions, args.budget)
+            result = {
+                'benchmark': 'memory.sessions',
+                'sessions': args.sessions,
+                'rows_per_session': args.session_transactions,
+                'budget': args.budget,
+                'bytes': total,
+                'resident_bytes': resident,
+                'reload_seconds': round(reload_seconds, 4),
+                'revision': revision,
+            }
+            output.write(json.dumps(result) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Local stand-in for the DeepSeek /v1/chat/completions endpoint.
+
+Point the app at it with DEEPSEEK_BASE_URL=http://127.0.0.1:<port>/v1.
+Run standalone with: python -m benchmarks.mock_deepseek [port] [latency_seconds]
+
+Conversion prompts (the ones with [Block N] markers) get a correct CSV
+back, produced with the local paste parser; every other prompt gets a
+canned analysis.
+"""
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.paste_format import iter_blocks
+
+BLOCK_MARKER_RE = re.compile(r'^\[Block (\d+)\]$', re.MULTILINE)
+
+CANNED_REPLY = (
+    "1. Overall portfolio performance: steady.\n"
+    "2. Key trends in trading patterns: frequent short-term trades.\n"
+    "3. Risk assessment: concentrated in a few tickers.\n"
+    "4. Suggestions for portfolio optimization: diversify."
+)
+
+
+def convert_blocks(prompt):
+    """What a well-behaved model would answer to a conversion prompt"""
+    data = prompt.split("Here's the transaction data:", 1)[-1].split("Remember:", 1)[0]
+    parts = BLOCK_MARKER_RE.split(data)
+    rows = ["block,date,security,transaction_type,amount"]
+    for number, text in zip(parts[1::2], parts[2::2]):
+        for block in iter_blocks(text.splitlines()):
+            if block.recognized and block.executed:
+                rows.append(f"{number},{block.date},{block.security},{block.transaction_type},{block.amount}")
+    return "\n".join(rows)
+
+
+class MockDeepSeekHandler(BaseHTTPRequestHandler):
+    reply = CANNED_REPLY
+    # Seconds before the first byte, and between streamed tokens
+    latency = 0.0
+    token_delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        reply = convert_blocks(prompt) if BLOCK_MARKER_RE.search(prompt) else self.reply
+        usage = {
+            "prompt_tokens": len(prompt) // 4 + 1,
+            "completion_tokens": len(reply) // 4 + 1,
+            "total_tokens": (len(prompt) + len(reply)) // 4 + 2,
+        }
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if body.get('stream'):
+            include_usage = (body.get('stream_options') or {}).get('include_usage')
+            self._send_stream(reply, usage if include_usage else None)
+        else:
+            self._send_json({
+                "choices": [{
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+
+    def _send_json(self, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, text, usage=None):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for token in text.split(' '):
+            chunk = {"choices": [{"delta": {"content": token + ' '}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            if self.token_delay:
+                time.sleep(self.token_delay)
+        if usage is not None:
+            # Like OpenAI-compatible APIs: an extra chunk with no choices, just usage
+            self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_server(port=0, latency=0.0, token_delay=0.0):
+    """Start the mock server on a background thread and return it"""
+    handler = type('ConfiguredMockHandler', (MockDeepSeekHandler,), {
+        'latency': latency,
+        'token_delay': token_delay,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    server = start_server(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 8765,
+        latency=float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    )
+    print(f"Mock DeepSeek listening on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
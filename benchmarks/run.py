@@ -0,0 +1,181 @@
+"""Benchmark suite for the parsing, conversion and dashboard hot paths.
+
+Run with: python -m benchmarks.run --sizes 1000,10000 --output results.jsonl
+
+Each measurement is written as one JSON object per line (best of
+--repeat runs) so results can be diffed or plotted across commits.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.mock_deepseek import start_server
+from benchmarks.synthetic import generate_transactions, to_csv_export, to_paste
+from utils import analytics
+from utils.api import ConversionCache, DeepSeekAPI
+from utils.data_parser import WealthSimpleParser
+from utils.ledger_index import LedgerFilter, LedgerIndex
+from utils.pnl import calculate_realized_pnl
+from utils.positions import ACB, FIFO, PositionBook
+from utils.price_cache import PriceCache
+from utils.response_cache import ResponseCache
+from utils.valuation import daily_valuation, instrument_names
+
+
+def best_of(fn, repeat):
+    """Minimum wall time of fn() over several runs, plus its last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def synthetic_prices(cache, df, seed=0):
+    """Fill a price cache with random-walk business-day closes for every instrument traded"""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(pd.Timestamp(df['date'].min()), pd.Timestamp(df['date'].max()))
+    for symbol in instrument_names(df).unique():
+        walk = np.exp(np.cumsum(rng.normal(0, 0.02, len(days))))
+        cache.put(symbol, pd.Series(rng.uniform(5, 300) * walk, index=days))
+    return cache
+
+
+def run_size(num_rows, repeat, convert_limit, emit):
+    records = generate_transactions(num_rows)
+    paste = to_paste(records)
+    parser = WealthSimpleParser()
+
+    seconds, df = best_of(lambda: parser.parse_transactions(paste), repeat)
+    emit('parse_transactions', num_rows, seconds)
+
+    export = to_csv_export(records)
+    seconds, (export_df, _) = best_of(lambda: parser.read_csv_export(io.StringIO(export)), repeat)
+    emit('read_csv_export', num_rows, seconds)
+
+    for method in (FIFO, ACB):
+        seconds, _ = best_of(lambda: PositionBook(method).apply_frame(export_df), repeat)
+        emit('positions.apply_frame', len(export_df), seconds, method=method)
+
+    with tempfile.TemporaryDirectory() as price_dir:
+        prices = synthetic_prices(PriceCache(price_dir), export_df)
+        seconds, _ = best_of(lambda: daily_valuation(export_df, prices), repeat)
+        emit('valuation.daily_valuation', len(export_df), seconds)
+
+    if num_rows <= convert_limit:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # Fresh cache per run so the first conversion really hits the mock API
+            def convert_cold():
+                api = DeepSeekAPI(cache=ConversionCache(os.path.join(cache_dir, f"{time.time_ns()}.sqlite3")))
+                return api.convert_to_csv(paste)
+
+            seconds, _ = best_of(convert_cold, repeat)
+            emit('convert_to_csv', num_rows, seconds, cache='cold')
+
+            warm_api = DeepSeekAPI(cache=ConversionCache(os.path.join(cache_dir, 'warm.sqlite3')))
+            warm_api.convert_to_csv(paste)
+            seconds, _ = best_of(lambda: warm_api.convert_to_csv(paste), repeat)
+            emit('convert_to_csv', num_rows, seconds, cache='warm')
+
+            # Fresh response cache per run, so every slice summary is requested again
+            def analyze_cold():
+                api = DeepSeekAPI(cache=ConversionCache(os.path.join(cache_dir, 'analysis.sqlite3')))
+                api.responses = ResponseCache()
+                return api.analyze_portfolio(df)
+
+            seconds, _ = best_of(analyze_cold, repeat)
+            emit('analyze_portfolio', num_rows, seconds, cache='cold')
+
+    seconds, _ = best_of(lambda: parser.calculate_portfolio_metrics(df), repeat)
+    emit('calculate_portfolio_metrics', num_rows, seconds)
+
+    # calculate_realized_pnl replaced Dashboard._calculate_profit_loss
+    seconds, _ = best_of(lambda: calculate_realized_pnl(df), repeat)
+    emit('calculate_realized_pnl', num_rows, seconds)
+
+    seconds, prepared = best_of(lambda: analytics.prepare_frame(df), repeat)
+    emit('dashboard.prepare_frame', num_rows, seconds)
+    for step in ('compute_metrics', 'cumulative_pl_series', 'allocation_series',
+                 'daily_counts_frame', 'recent_transactions_frame'):
+        seconds, _ = best_of(lambda: getattr(analytics, step)(prepared), repeat)
+        emit(f'dashboard.{step}', num_rows, seconds)
+
+    seconds, _ = best_of(lambda: analytics.build_snapshot(df), repeat)
+    emit('dashboard.build_snapshot', num_rows, seconds)
+
+    # Filtered dashboard: index built once per ledger, then one snapshot per filter change
+    seconds, index = best_of(lambda: LedgerIndex(export_df, max_cached=0), repeat)
+    emit('ledger_index.build', len(export_df), seconds)
+    last_day = index.dates[-1].astype('datetime64[D]').astype(object)
+    filters = {
+        'ticker': LedgerFilter(tickers=(str(export_df['security'].iloc[0]),)),
+        'last_30_days': LedgerFilter(start=last_day - timedelta(days=30)),
+        'account': LedgerFilter(accounts=(str(export_df['account'].iloc[0]),)),
+    }
+    for name, ledger_filter in filters.items():
+        seconds, _ = best_of(lambda: index.snapshot(ledger_filter), repeat)
+        emit('ledger_index.snapshot', len(export_df), seconds, filter=name)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='comma-separated ledger sizes (transactions)')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--latency', type=float, default=0.2,
+                            help='mock DeepSeek latency per request, in seconds')
+    arg_parser.add_argument('--convert-limit', type=int, default=10000,
+                            help='largest size to run through convert_to_csv')
+    arg_parser.add_argument('--output', help='append JSON lines here instead of stdout')
+    args = arg_parser.parse_args(argv)
+
+    server = start_server(latency=args.latency)
+    os.environ['DEEPSEEK_BASE_URL'] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault('DEEPSEEK_API_KEY', 'benchmark')
+
+    context = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'mock_latency': args.latency,
+    }
+    output = open(args.output, 'a') if args.output else sys.stdout
+
+    def emit(name, rows, seconds, **extra):
+        result = {'benchmark': name, 'rows': rows, 'seconds': round(seconds, 6),
+                  'rows_per_second': round(rows / seconds) if seconds else None, **extra, **context}
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+
+    try:
+        for size in [int(value) for value in args.sizes.split(',')]:
+            run_size(size, args.repeat, args.convert_limit, emit)
+    finally:
+        server.shutdown()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Startup benchmark: time to first paint of each page in a fresh process.
+
+Run with: python -m benchmarks.startup --repeat 5 --output results.jsonl
+
+Every measurement starts a new interpreter, imports Streamlit (not
+counted, it is paid once per server anyway) and then times the first
+complete run of one page script with Streamlit's AppTest, which includes
+importing everything the page needs. Each page is measured twice: with
+no saved ledger ("empty", the "upload first" path) and with a saved
+synthetic ledger ("loaded"), opened through its ?ledger= id. Results
+are JSON lines, like benchmarks.run.
+
+DeepSeek calls (the chat page's initial analysis) go to
+benchmarks.mock_deepseek, so the figures measure startup rather than
+network round-trips, and the benchmark runs offline.
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.mock_deepseek import start_server
+from benchmarks.run import git_revision
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEDGER_ID = 'startup-benchmark'
+
+# Executed in the fresh interpreter; prints the page's first run time in seconds
+MEASURE = """
+import sys, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.query_params['ledger'] = sys.argv[2]
+at.run()
+seconds = time.perf_counter() - start
+if at.exception:
+    raise SystemExit(f"page raised: {at.exception[0].value}")
+print(seconds)
+"""
+
+
+def pages():
+    return [os.path.join(ROOT, 'main.py')] + sorted(glob.glob(os.path.join(ROOT, 'pages', '*.py')))
+
+
+def save_ledger(db_path, num_transactions):
+    """Save a synthetic ledger under LEDGER_ID in a fresh ledger database"""
+    env = dict(os.environ, LEDGER_DB_PATH=db_path)
+    script = (
+        "from benchmarks.synthetic import generate_transactions, to_paste\n"
+        "from utils.data_parser import WealthSimpleParser\n"
+        "from utils.ledger import Ledger\n"
+        "from utils.ledger_store import get_ledger_store\n"
+        "ledger = Ledger()\n"
+        f"WealthSimpleParser().append(to_paste(generate_transactions({num_transactions})), ledger, use_api=False)\n"
+        f"get_ledger_store().save_ledger({LEDGER_ID!r}, ledger)\n"
+    )
+    subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, check=True)
+
+
+def first_paint(page, db_path, base_url):
+    env = dict(os.environ, LEDGER_DB_PATH=db_path, PYTHONPATH=ROOT,
+               DEEPSEEK_BASE_URL=base_url, DEEPSEEK_API_KEY='benchmark')
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE, page, LEDGER_ID], cwd=ROOT, env=env,
+        check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--transactions', type=int, default=10000,
+                            help='size of the saved ledger for the "loaded" runs')
+    arg_parser.add_argument('--output', help='append JSON lines here instead of stdout')
+    args = arg_parser.parse_args(argv)
+
+    output = open(args.output, 'a') if args.output else sys.stdout
+    revision = git_revision()
+    server = start_server()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            databases = {
+                'empty': os.path.join(directory, 'empty.sqlite3'),
+                'loaded': os.path.join(directory, 'loaded.sqlite3'),
+            }
+            save_ledger(databases['loaded'], args.transactions)
+
+            for page in pages():
+                for state, db_path in databases.items():
+                    runs = [first_paint(page, db_path, base_url) for _ in range(args.repeat)]
+                    result = {
+                        'benchmark': 'startup.first_paint',
+                        'page': os.path.relpath(page, ROOT),
+                        'ledger': state,
+                        'seconds': round(min(runs), 4),
+                        'median_seconds': round(sorted(runs)[len(runs) // 2], 4),
+                        'revision': revision,
+                    }
+                    output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    output.flush()
+    finally:
+        server.shutdown()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Synthetic Wealthsimple transaction histories for benchmarking.
+
+generate_transactions() produces realistic order records, which can be
+rendered as the activity paste layout (to_paste) or as the 21-column
+CSV export (to_csv_export) shown in attached_assets.
+"""
+import csv
+import io
+from datetime import date, timedelta
+
+import numpy as np
+
+TICKERS = [
+    'AAPL', 'AMD', 'AMZN', 'CRNT', 'GOOG', 'MSFT', 'MU', 'NUKK', 'NVDA', 'PLTR',
+    'PTK', 'QBTS', 'QUBT', 'RGTI', 'SOUN', 'TSLA', 'SHOP', 'RY', 'TD', 'ENB',
+]
+ACCOUNTS = ['TFSA', 'RRSP', 'Non-registered']
+ORDER_KINDS = ['Limit', 'Market', 'Fractional']
+STATUSES = ['Completed', 'Cancelled', 'Expired']
+STATUS_WEIGHTS = [0.88, 0.10, 0.02]
+
+CSV_EXPORT_COLUMNS = [
+    'Transaction Date', 'Ticker', 'Details', 'Transaction Type', 'Sub-Type', 'Account',
+    'Amount (CAD)', 'Status', 'Submitted Date', 'Submitted Time', 'Filled Date', 'Filled Time',
+    'Order Type', 'Buy/Sell', 'Time in Force', 'Limit Price', 'Entered Quantity',
+    'Filled Quantity', 'Fees', 'Exchange Rate', 'Total Cost/Value (CAD)',
+]
+
+
+def generate_transactions(num_transactions, num_tickers=None, seed=0, end_date=date(2024, 12, 31),
+                          trades_per_day=8):
+    """Random order records, newest first, as a list of dicts"""
+    rng = np.random.default_rng(seed)
+    tickers = TICKERS if num_tickers is None else (
+        TICKERS + [f"SYN{i:04d}" for i in range(max(0, num_tickers - len(TICKERS)))]
+    )[:num_tickers]
+
+    ticker_index = rng.integers(0, len(tickers), num_transactions)
+    is_option = rng.random(num_transactions) < 0.05
+    is_buy = rng.random(num_transactions) < 0.55
+    kinds = rng.integers(0, len(ORDER_KINDS), num_transactions)
+    accounts = rng.choice(len(ACCOUNTS), num_transactions, p=[0.7, 0.2, 0.1])
+    statuses = rng.choice(len(STATUSES), num_transactions, p=STATUS_WEIGHTS)
+    quantities = rng.integers(1, 40, num_transactions)
+    prices = rng.uniform(2, 400, num_transactions).round(2)
+    # Several trades per day on average, newest first
+    day_offsets = np.sort(rng.integers(0, max(1, num_transactions // trades_per_day), num_transactions))
+
+    records = []
+    for i in range(num_transactions):
+        ticker = tickers[ticker_index[i]]
+        side = 'buy' if is_buy[i] else 'sell'
+        kind = ORDER_KINDS[kinds[i]]
+        if kind == 'Fractional' and not is_buy[i]:
+            kind = 'Market'
+        quantity = int(quantities[i])
+        price = float(prices[i])
+        details = ''
+        if is_option[i]:
+            details = f"Dec 19 ${int(price // 10 + 1)} Call"
+            price = round(price / 100, 2)
+        multiplier = 100 if is_option[i] else 1
+        records.append({
+            'date': end_date - timedelta(days=int(day_offsets[i])),
+            'ticker': ticker,
+            'details': details,
+            'order_type': f"{kind} {side}",
+            'side': side,
+            'account': ACCOUNTS[accounts[i]],
+            'amount': round(quantity * price * multiplier * 1.4, 2),
+            'status': STATUSES[statuses[i]],
+            'quantity': quantity,
+            'price': price,
+            'is_option': bool(is_option[i]),
+        })
+    return records
+
+
+def to_paste(records):
+    """Render records in the copy-pasted activity layout"""
+    lines = []
+    current_date = None
+    for record in records:
+        if record['date'] != current_date:
+            current_date = record['date']
+            lines += [f"{current_date:%B} {current_date.day}, {current_date.year}", "", ""]
+        if record['details']:
+            lines += [f"{record['ticker']} {record['details']}", ""]
+        else:
+            lines += [record['ticker'], "", record['ticker'], ""]
+        lines += [
+            record['order_type'], "",
+            record['account'], "",
+            f"${record['amount']:,.2f} CAD", "",
+        ]
+        if record['status'] != 'Completed':
+            lines += [record['status'], ""]
+        lines.append("")
+    return "\n".join(lines)
+
+
+def to_csv_export(records):
+    """Render records as Wealthsimple's 21-column CSV export"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_EXPORT_COLUMNS)
+    for record in records:
+        day = record['date'].isoformat()
+        unit = 'contract' if record['is_option'] else 'share'
+        quantity = f"{record['quantity']} {unit}{'s' if record['quantity'] != 1 else ''}"
+        filled = f"{quantity} x ${record['price']} USD" if record['status'] == 'Completed' else ''
+        writer.writerow([
+            day, record['ticker'], record['details'], record['order_type'].capitalize(),
+            'Buy to open' if record['side'] == 'buy' else 'Sell to close',
+            record['account'], f"{record['amount']:.2f}", record['status'],
+            day, '12:34 pm', day, '12:34 pm',
+            record['order_type'].capitalize(),
+            'Buy to open' if record['side'] == 'buy' else 'Sell to close',
+            'Good for day', f"{record['price']} USD", quantity, filled,
+            '2.00 USD' if record['is_option'] else '', '1.4', f"{record['amount']:.2f}",
+        ])
+    return output.getvalue()
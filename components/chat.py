@@ -1,28 +1,39 @@
 import streamlit as st
-from utils.api import DeepSeekAPI
+from utils.api import get_deepseek_api
+from utils.chat_context import ChatContextBuilder
+from utils.query_engine import QueryEngine
+from utils.ledger import frame_fingerprint
+from utils.session import get_session_data, set_session_data
 
 class ChatInterface:
-    def __init__(self):
-        self.api = DeepSeekAPI()
+    def __init__(self, context_token_budget=1500):
+        self.api = get_deepseek_api()
+        self.context_token_budget = context_token_budget
 
-    def render(self, transactions_df):
-        """Render the chat interface"""
+    def _ledger_tools(self, transactions_df, fingerprint):
+        """Context builder and query engine, rebuilt only when the ledger's fingerprint changes"""
+        cached = get_session_data("chat_context")
+        if cached is None or cached[0] != fingerprint:
+            cached = (
+                fingerprint,
+                ChatContextBuilder(transactions_df, token_budget=self.context_token_budget),
+                QueryEngine(transactions_df)
+            )
+            # Derived from the ledger, so it is dropped rather than spilled when the session idles
+            set_session_data("chat_context", cached, spill=False)
+        return cached
+
+    def render(self, transactions_df, ledger_fingerprint=None):
+        """Render the chat interface; ledger_fingerprint is Ledger.content_fingerprint, hashed here if not given"""
+        if ledger_fingerprint is None:
+            ledger_fingerprint = frame_fingerprint(transactions_df)
         st.header("AI Analysis Chat", divider="red")
 
         # Create a container for all chat content
         chat_container = st.container()
 
-        # Initialize or get chat history from session state
-        if "chat_messages" not in st.session_state:
-            st.session_state.chat_messages = []
-
-            # Generate initial analysis
-            with st.spinner("Analyzing portfolio..."):
-                initial_analysis = self.api.analyze_portfolio(transactions_df)
-                st.session_state.chat_messages.append({
-                    "role": "assistant",
-                    "content": initial_analysis
-                })
+        # Chat history lives in the session data store, which may have spilled it to disk
+        messages = get_session_data("chat_messages", [])
 
         # Use the container to manage chat layout
         with chat_container:
@@ -34,7 +45,7 @@ class ChatInterface:
 
             # Display all messages in the messages container
             with messages_container:
-                for message in st.session_state.chat_messages:
+                for message in messages:
                     with st.chat_message(message["role"]):
                         # Format numerical values and calculations
                         content = message["content"]
@@ -47,14 +58,31 @@ class ChatInterface:
                         else:
                             st.markdown(content)
 
+                # Stream the initial analysis the first time the page is opened
+                if not messages:
+                    with st.chat_message("assistant"):
+                        try:
+                            initial_analysis = st.write_stream(self.api.analyze_portfolio_stream(transactions_df, ledger_fingerprint))
+                        except Exception as e:
+                            # Not saved, so the next run tries again
+                            initial_analysis = None
+                            st.error(f"Error analyzing portfolio: {str(e)}")
+                    if initial_analysis is not None:
+                        messages.append({
+                            "role": "assistant",
+                            "content": initial_analysis
+                        })
+                        set_session_data("chat_messages", messages)
+
             # Handle new messages
             with input_container:
                 if prompt := st.chat_input("Ask about your portfolio...", key="chat_input"):
                     # Add user message
-                    st.session_state.chat_messages.append({
+                    messages.append({
                         "role": "user",
                         "content": prompt
                     })
+                    set_session_data("chat_messages", messages)
 
                     # Display user message
                     with messages_container:
@@ -66,21 +94,33 @@ class ChatInterface:
                             response_placeholder = st.empty()
 
                             try:
-                                with st.spinner("Thinking..."):
-                                    context = transactions_df.to_string()
-                                    response = self.api.chat_response(prompt, context)
-
-                                    # Update response and chat history
-                                    formatted_response = response.replace("$", "\\$")  # Escape dollar signs for markdown
-                                    response_placeholder.markdown(f"""
-                                        <div style='font-size: 16px; line-height: 1.6;'>
-                                            {formatted_response}
-                                        </div>
-                                        """, unsafe_allow_html=True)
-                                    st.session_state.chat_messages.append({
-                                        "role": "assistant",
-                                        "content": formatted_response
-                                    })
+                                _, context_builder, query_engine = self._ledger_tools(transactions_df, ledger_fingerprint)
+
+                                # Answer numeric questions locally, only open-ended ones go to the LLM
+                                local_answer = query_engine.answer(prompt)
+                                if local_answer is not None:
+                                    formatted_response = local_answer.replace("$", "\\$")
+                                else:
+                                    context = context_builder.build(prompt)
+
+                                    # Render tokens as they arrive, escaping dollar signs for markdown
+                                    with response_placeholder:
+                                        formatted_response = st.write_stream(
+                                            chunk.replace("$", "\\$")
+                                            for chunk in self.api.chat_response_stream(prompt, context, ledger_fingerprint)
+                                        )
+
+                                # Finalize the response and chat history
+                                response_placeholder.markdown(f"""
+                                    <div style='font-size: 16px; line-height: 1.6;'>
+                                        {formatted_response}
+                                    </div>
+                                    """, unsafe_allow_html=True)
+                                messages.append({
+                                    "role": "assistant",
+                                    "content": formatted_response
+                                })
+                                set_session_data("chat_messages", messages)
                             except Exception as e:
                                 error_message = f"Error generating response: {str(e)}"
                                 response_placeholder.error(error_message)
\ No newline at end of file
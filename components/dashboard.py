@@ -1,80 +1,79 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import pandas as pd
-import numpy as np
+from utils.instrumentation import timed
+from utils.ledger_index import LedgerFilter
+
+# Above this many points, line charts are drawn with WebGL
+WEBGL_THRESHOLD = 1000
 
 class Dashboard:
     def __init__(self):
         self.colors = ['#FF4B4B', '#0068C9', '#FF8B4B', '#29B09D', '#F7DC6F']
 
-    def render(self, transactions_df, metrics):
-        """Render the dashboard with enhanced charts and metrics"""
+    @timed('dashboard.render')
+    def render(self, snapshot):
+        """Render the dashboard with enhanced charts and metrics from an analytics snapshot"""
         st.header("Portfolio Dashboard", divider="red")
 
         # Display key metrics
-        self._render_metrics(metrics)
+        self._render_metrics(snapshot.metrics)
 
         # Top section: Monthly Performance and Asset Allocation
         col1, col2 = st.columns(2)
         with col1:
-            self._render_monthly_performance(transactions_df)
+            self._render_monthly_performance(snapshot.cumulative_pl)
         with col2:
-            self._render_asset_allocation(transactions_df)
+            self._render_asset_allocation(snapshot.allocation)
+
+        # Market value, only when quantities and cached prices are available
+        if snapshot.valuation is not None:
+            self._render_portfolio_value(snapshot.valuation)
 
         # Middle section: Transaction Analysis
         st.subheader("Transaction Analysis")
         col3, col4 = st.columns(2)
         with col3:
-            self._render_transaction_frequency(transactions_df)
+            self._render_transaction_frequency(snapshot.daily_counts, snapshot.volume_bucket)
         with col4:
-            self._render_profit_loss_chart(transactions_df)
+            self._render_profit_loss_chart(snapshot.security_pl)
 
         # Bottom section: Transaction History and Top Performers
         col5, col6 = st.columns(2)
         with col5:
-            self._render_transaction_history(transactions_df)
+            self._render_transaction_history(snapshot.recent_transactions)
         with col6:
-            self._render_top_performers(transactions_df)
-
-    def _calculate_profit_loss(self, df):
-        """Calculate profit/loss using FIFO method for accurate gains/losses"""
-        results = {}
-
-        for security in df['security'].unique():
-            security_trades = df[df['security'] == security].sort_values('date')
-            buy_queue = []
-            total_profit = 0
-
-            for _, trade in security_trades.iterrows():
-                if trade['transaction_type'] == 'BUY':
-                    buy_queue.append((abs(trade['amount']), trade['date']))
-                elif trade['transaction_type'] == 'SELL':
-                    sell_amount = abs(trade['amount'])
-                    sell_date = trade['date']
-
-                    while sell_amount > 0 and buy_queue:
-                        buy_amount, buy_date = buy_queue.pop(0)
-
-                        if buy_amount <= sell_amount:
-                            # Complete sell of this buy lot
-                            profit = sell_amount - buy_amount
-                            total_profit += profit
-                            sell_amount -= buy_amount
-                        else:
-                            # Partial sell
-                            profit = sell_amount - (buy_amount * (sell_amount / buy_amount))
-                            total_profit += profit
-                            # Put remaining amount back in queue
-                            remaining = buy_amount - sell_amount
-                            buy_queue.insert(0, (remaining, buy_date))
-                            sell_amount = 0
-
-            results[security] = total_profit
-
-        return results
+            self._render_top_performers(snapshot.security_pl)
+
+    @timed('dashboard.render_filters')
+    def render_filters(self, first_date, last_date, tickers, accounts):
+        """Date range, account and ticker filters; returns the LedgerFilter they select"""
+        first_date, last_date = first_date.date(), last_date.date()
+        col1, col2, col3 = st.columns([2, 1, 2])
+        with col1:
+            date_range = st.date_input(
+                "Date range",
+                value=(first_date, last_date),
+                min_value=first_date,
+                max_value=last_date,
+                key="filter_dates"
+            )
+        with col2:
+            selected_accounts = st.multiselect("Accounts", accounts, key="filter_accounts") if accounts else []
+        with col3:
+            selected_tickers = st.multiselect("Tickers", tickers, key="filter_tickers")
+
+        # While a range is being picked only its start is set
+        start = date_range[0] if len(date_range) > 0 else first_date
+        end = date_range[1] if len(date_range) > 1 else last_date
+        return LedgerFilter(
+            start=start if start > first_date else None,
+            end=end if end < last_date else None,
+            tickers=tuple(sorted(selected_tickers)),
+            accounts=tuple(sorted(selected_accounts)),
+        )
 
+    @timed('dashboard._render_metrics')
     def _render_metrics(self, metrics):
         """Display enhanced key portfolio metrics"""
         st.subheader("Key Metrics")
@@ -111,33 +110,28 @@ class Dashboard:
                 help="Number of different securities in portfolio"
             )
 
-    def _render_monthly_performance(self, df):
+    @timed('dashboard._render_monthly_performance')
+    def _render_monthly_performance(self, cumulative_pl):
         """Create monthly cumulative profit chart"""
         st.header("Monthly Performance", divider="red")
 
-        # Convert date to datetime and sort
-        df['date'] = pd.to_datetime(df['date'])
-        df_sorted = df.sort_values('date')
-
-        # Calculate daily P/L and cumulative sum
-        df_sorted['profit_loss'] = df_sorted.apply(
-            lambda x: -x['amount'] if x['transaction_type'] == 'SELL' else 0, axis=1
-        )
-        df_sorted['cumulative_pl'] = df_sorted['profit_loss'].cumsum()
-
         # Create figure
         fig = go.Figure()
 
+        # WebGL cannot draw splines, so large series use straight segments
+        use_webgl = len(cumulative_pl) > WEBGL_THRESHOLD
+        trace_type = go.Scattergl if use_webgl else go.Scatter
+
         # Add main trace with improved styling
         fig.add_trace(
-            go.Scatter(
-                x=df_sorted['date'],
-                y=df_sorted['cumulative_pl'],
+            trace_type(
+                x=cumulative_pl['date'],
+                y=cumulative_pl['cumulative_pl'],
                 mode='lines',
                 line=dict(
                     color='#29B09D',  # Teal color matching screenshot
                     width=2,
-                    shape='spline'  # Smooth curve
+                    shape='linear' if use_webgl else 'spline'  # Smooth curve
                 ),
                 hovertemplate="<b>%{x|%b %d, %Y}</b><br>" +
                              "$%{y:,.2f}<extra></extra>"  # Clean hover format
@@ -196,19 +190,69 @@ class Dashboard:
             'displayModeBar': False  # Hide the plotly mode bar
         })
 
-    def _render_transaction_frequency(self, df):
+    @timed('dashboard._render_portfolio_value')
+    def _render_portfolio_value(self, valuation):
+        """Display daily market value against cost basis, and each holding's contribution"""
+        st.subheader("Portfolio Value")
+
+        if valuation.unpriced:
+            st.caption(f"No cached prices for: {', '.join(valuation.unpriced)}")
+
+        daily = valuation.daily
+        if not daily['market_value'].any():
+            st.info("Add closing prices to the local price cache to see market value over time")
+            return
+
+        col1, col2 = st.columns(2)
+        with col1:
+            trace_type = go.Scattergl if len(daily) > WEBGL_THRESHOLD else go.Scatter
+            fig = go.Figure()
+            fig.add_trace(trace_type(
+                x=daily['date'], y=daily['market_value'], mode='lines', name='Market Value',
+                line=dict(color='#0068C9', width=2)
+            ))
+            fig.add_trace(trace_type(
+                x=daily['date'], y=daily['cost_basis'], mode='lines', name='Cost Basis',
+                line=dict(color='#FF8B4B', width=1, dash='dot')
+            ))
+            fig.update_layout(
+                title='Market Value vs Cost Basis',
+                xaxis_title="Date",
+                yaxis_title="Value ($)",
+                yaxis_tickprefix='$',
+                hovermode='x unified'
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+        with col2:
+            contribution = valuation.contribution.dropna(subset=['close'])
+            contribution = contribution['unrealized_pl'].sort_values(ascending=True)
+            fig = go.Figure()
+            fig.add_trace(go.Bar(
+                x=contribution.index,
+                y=contribution.values,
+                marker_color=['#FF4B4B' if x < 0 else '#29B09D' for x in contribution.values]
+            ))
+            fig.update_layout(
+                title='Unrealized Profit/Loss by Holding',
+                xaxis_title="Security",
+                yaxis_title="Unrealized Profit/Loss ($)",
+                showlegend=False,
+                xaxis_tickangle=45
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+    @timed('dashboard._render_transaction_frequency')
+    def _render_transaction_frequency(self, daily_counts, volume_bucket):
         """Display transaction frequency analysis"""
         st.subheader("Transaction Frequency")
 
-        # Calculate daily transaction counts
-        daily_counts = df.groupby('date').size().reset_index()
-        daily_counts.columns = ['date', 'count']
-
         fig = px.line(
             daily_counts,
             x='date',
             y='count',
-            title='Daily Transaction Volume'
+            title=f'{volume_bucket} Transaction Volume',
+            render_mode='webgl' if len(daily_counts) > WEBGL_THRESHOLD else 'svg'
         )
         fig.update_layout(
             xaxis_title="Date",
@@ -217,18 +261,11 @@ class Dashboard:
         )
         st.plotly_chart(fig, use_container_width=True)
 
-    def _render_asset_allocation(self, df):
+    @timed('dashboard._render_asset_allocation')
+    def _render_asset_allocation(self, allocation):
         """Create enhanced asset allocation pie chart"""
         st.subheader("Asset Allocation")
 
-        # Calculate net position per security
-        df['net_amount'] = df.apply(lambda x: x['amount'] if x['transaction_type'] == 'BUY' else -x['amount'], axis=1)
-        allocation = df.groupby('security')['net_amount'].sum().abs()
-        total = allocation.sum()
-
-        # Calculate percentages
-        allocation_pct = (allocation / total * 100).round(2)
-
         fig = px.pie(
             values=allocation.values,
             names=allocation.index,
@@ -243,13 +280,12 @@ class Dashboard:
         )
         st.plotly_chart(fig, use_container_width=True)
 
-    def _render_profit_loss_chart(self, df):
+    @timed('dashboard._render_profit_loss_chart')
+    def _render_profit_loss_chart(self, security_pl):
         """Create enhanced profit/loss visualization"""
         st.subheader("Profit/Loss by Security")
 
-        # Calculate profit/loss using FIFO method
-        pl_by_security = pd.Series(self._calculate_profit_loss(df))
-        pl_by_security = pl_by_security.sort_values(ascending=True)
+        pl_by_security = security_pl.sort_values(ascending=True)
 
         fig = go.Figure()
         fig.add_trace(go.Bar(
@@ -267,14 +303,11 @@ class Dashboard:
         )
         st.plotly_chart(fig, use_container_width=True)
 
-    def _render_transaction_history(self, df):
+    @timed('dashboard._render_transaction_history')
+    def _render_transaction_history(self, recent_transactions):
         """Display enhanced transaction history table"""
         st.subheader("Recent Transactions")
 
-        # Get last 10 transactions with formatted values
-        recent_transactions = df.sort_values('date', ascending=False).head(10).copy()
-        recent_transactions['amount'] = recent_transactions['amount'].apply(lambda x: f"${abs(x):,.2f}")
-
         # Add styling
         st.dataframe(
             recent_transactions[['date', 'transaction_type', 'security', 'amount']],
@@ -282,13 +315,11 @@ class Dashboard:
             hide_index=True
         )
 
-    def _render_top_performers(self, df):
+    @timed('dashboard._render_top_performers')
+    def _render_top_performers(self, security_pl):
         """Display top performing securities"""
         st.subheader("Top Gainers")
 
-        # Calculate profit/loss using FIFO method
-        security_pl = pd.Series(self._calculate_profit_loss(df))
-
         # Show only top gainers
         top_gainers = security_pl[security_pl > 0].sort_values(ascending=False).head(3)
         for security, profit in top_gainers.items():
@@ -1,5 +1,8 @@
+import io
 import streamlit as st
-from utils.data_parser import WealthSimpleParser
+from utils.jobs import CANCELLED, DONE, get_job_queue
+from utils.ledger_store import get_ledger_store
+from utils.session import current_ledger_id, load_session_ledger, set_session_ledger
 
 # Page configuration
 st.set_page_config(
@@ -9,8 +12,81 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Initialize components
-parser = WealthSimpleParser()
+def process_input(ledger, raw_data, csv_bytes, ledger_id, replace, attempts=3):
+    """Background job: merge the CSV export and/or pasted text into the ledger, then save it"""
+    # The parser pulls in pandas and the API client, so only load it when there is work
+    from utils.data_parser import get_parser
+    from utils.ledger_store import LedgerChangedError
+
+    parser = get_parser()
+    store = get_ledger_store()
+    for _ in range(attempts):
+        added = 0
+        if csv_bytes is not None:
+            added += parser.append_csv_export(io.BytesIO(csv_bytes), ledger)
+        if raw_data:
+            added += parser.append(raw_data, ledger)
+        if len(ledger) == 0:
+            raise ValueError("No transactions found in the input")
+
+        # Nothing is written until every input has been merged, so a failed or
+        # cancelled job leaves the saved ledger as it was
+        if replace:
+            # A fresh ledger replaces the saved one
+            store.save_ledger(ledger_id, ledger)
+            return ledger, added
+        try:
+            store.save_appended(ledger_id, ledger)
+            return ledger, added
+        except LedgerChangedError:
+            # Another tab saved to this ledger meanwhile: merge into what it saved instead,
+            # so trades both of them added are only stored once (conversions are cached)
+            ledger = store.load_ledger(ledger_id).copy()
+    raise ValueError("Your saved data kept changing while processing; please try again")
+
+@st.fragment(run_every=1.0)
+def render_job_status():
+    """Poll the background processing job and publish its ledger once it finishes"""
+    job = get_job_queue().get(st.session_state.get('processing_job'))
+    if job is None:
+        # Expired or lost with a server restart
+        st.session_state.processing_job = None
+        st.rerun()
+
+    if not job.is_finished:
+        done, total = job.progress
+        if total:
+            st.progress(done / total, text=f"Converting transactions... {done}/{total} blocks")
+        else:
+            st.progress(0.0, text="Processing data...")
+        if st.button("Cancel"):
+            job.cancel()
+        return
+
+    st.session_state.processing_job = None
+    if job.status == DONE:
+        ledger, added = job.result
+        # Auto-confirm when processing succeeds
+        set_session_ledger(ledger)
+        if st.session_state.get('processing_append'):
+            message = f"Added {added} new transactions. You can now navigate to the Dashboard or AI Chat Analysis pages."
+        else:
+            message = "Data processed successfully! You can now navigate to the Dashboard or AI Chat Analysis pages."
+        st.session_state.job_outcome = [('success', message)]
+    elif job.status == CANCELLED:
+        st.session_state.job_outcome = [(
+            'warning',
+            "Processing cancelled. Transactions converted so far are cached, "
+            "so processing the same data again continues where it stopped."
+        )]
+    else:
+        st.session_state.job_outcome = [
+            ('error', f"Error processing data: {job.error}"),
+            ('info', "Please ensure your data is in the correct Wealthsimple format"),
+        ]
+        st.session_state.data_processed = False
+        st.session_state.data_confirmed = False
+    st.rerun()
 
 def main():
     st.title("Upload Data") 
@@ -29,10 +105,13 @@ def main():
     ### How to Use
     1. Copy your Wealthsimple transaction history
     2. Paste it in the text box below
-    3. Click "Process Data" to analyze
+    3. Click "Process Data" to analyze (or upload the CSV export instead)
     4. Navigate to Dashboard or AI Chat Analysis for insights
     """)
 
+    # Pick up a previously saved ledger
+    ledger = load_session_ledger()
+
     # Initialize session state for tracking app state
     if 'data_processed' not in st.session_state:
         st.session_state.data_processed = False
@@ -49,23 +128,47 @@ def main():
         help="Copy and paste your Wealthsimple transaction history here"
     )
 
-    analyze_button = st.button("Process Data")
+    uploaded_file = st.file_uploader(
+        "Or upload a Wealthsimple CSV export",
+        type="csv",
+        help="CSV exports are read directly, without any AI processing"
+    )
 
-    # Process data when button is clicked
-    if analyze_button and raw_data:
-        try:
-            csv_content, transactions_df = parser.api.convert_to_csv(raw_data)
-            st.session_state.data_processed = True
-            st.session_state.data_confirmed = True  # Auto-confirm when processing succeeds
-            st.session_state.current_csv = csv_content
-            st.session_state.current_df = transactions_df
-            st.success("Data processed successfully! You can now navigate to the Dashboard or AI Chat Analysis pages.")
-
-        except Exception as e:
-            st.error(f"Error processing data: {str(e)}")
-            st.info("Please ensure your data is in the correct Wealthsimple format")
-            st.session_state.data_processed = False
-            st.session_state.data_confirmed = False
+    append_mode = False
+    if ledger is not None:
+        append_mode = st.checkbox(
+            "Add to existing data",
+            value=True,
+            help="Only transactions that are not already loaded will be processed"
+        )
+
+    # Processing runs as a background job, so the page stays usable meanwhile
+    job_running = bool(st.session_state.get('processing_job'))
+    analyze_button = st.button("Process Data", disabled=job_running)
+
+    # Submit the data when button is clicked
+    if analyze_button and (raw_data or uploaded_file is not None):
+        from utils.ledger import Ledger
+
+        job = get_job_queue().submit(
+            process_input,
+            ledger.copy() if append_mode else Ledger(),
+            raw_data,
+            uploaded_file.getvalue() if uploaded_file is not None else None,
+            current_ledger_id(),
+            not append_mode,
+            description="Process Data"
+        )
+        st.session_state.processing_job = job.id
+        st.session_state.processing_append = append_mode
+        job_running = True
+
+    if job_running:
+        render_job_status()
+
+    # Outcome of the last job, shown once
+    for kind, message in st.session_state.pop('job_outcome', []):
+        getattr(st, kind)(message)
 
     # Show welcome message if no data processed
     if not st.session_state.data_processed:
@@ -1,25 +1,41 @@
 import streamlit as st
-from components.dashboard import Dashboard
-from utils.data_parser import WealthSimpleParser
+from utils.session import load_session_ledger
 
 st.set_page_config(page_title="Investment Dashboard", page_icon="📊", layout="wide")
 
-# Initialize components
-parser = WealthSimpleParser()
-dashboard = Dashboard()
-
 def main():
     st.title("Investment Dashboard")
 
-    if not st.session_state.get('data_confirmed', False):
+    # Load the saved ledger when the session has none yet
+    ledger = load_session_ledger()
+
+    if ledger is None or not st.session_state.get('data_confirmed', False):
         st.warning("Please upload and confirm your data on the home page first")
         return
 
-    # Calculate metrics for the dashboard
-    metrics = parser.calculate_portfolio_metrics(st.session_state.current_df)
-    
+    # Plotly and the analytics stack are only imported once there is data to show
+    from components.dashboard import Dashboard
+    from utils.analytics import get_snapshot
+    from utils.ledger_index import get_filter_options, get_ledger_index
+    from utils.price_cache import get_price_cache
+
+    dashboard = Dashboard()
+    ledger_filter = dashboard.render_filters(*get_filter_options(ledger.df, ledger.content_fingerprint))
+    prices = get_price_cache()
+
+    if ledger_filter.active:
+        # Filtered views come from the ledger's indexes, built once per ledger content
+        index = get_ledger_index(ledger.df, ledger.content_fingerprint)
+        if len(index.rows(ledger_filter)) == 0:
+            st.info("No transactions match these filters")
+            return
+        snapshot = index.snapshot(ledger_filter, prices)
+    else:
+        # Use the ledger's running metrics; snapshots are shared by content, not just version
+        snapshot = get_snapshot(ledger.df, ledger.content_fingerprint, ledger.metrics, prices)
+
     # Render dashboard
-    dashboard.render(st.session_state.current_df, metrics)
+    dashboard.render(snapshot)
 
 if __name__ == "__main__":
     main()
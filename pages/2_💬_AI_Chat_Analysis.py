@@ -1,20 +1,23 @@
 import streamlit as st
-from components.chat import ChatInterface
+from utils.session import load_session_ledger
 
 st.set_page_config(page_title="AI Chat Analysis", page_icon="💬", layout="wide")
 
-# Initialize chat interface
-chat = ChatInterface()
-
 def main():
     st.title("AI Chat Analysis")
 
-    if not st.session_state.get('data_confirmed', False):
+    # Load the saved ledger when the session has none yet
+    ledger = load_session_ledger()
+
+    if ledger is None or not st.session_state.get('data_confirmed', False):
         st.warning("Please upload and confirm your data on the home page first")
         return
 
-    # Render chat interface
-    chat.render(st.session_state.current_df)
+    # The chat stack (API client, pandas) is only imported once there is data to chat about
+    from components.chat import ChatInterface
+
+    # Render chat interface; it shares the process-wide DeepSeek client and the ledger's memoized fingerprint
+    ChatInterface().render(ledger.df, ledger.content_fingerprint)
 
 if __name__ == "__main__":
     main()
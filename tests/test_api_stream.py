@@ -0,0 +1,90 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.api import ConversionCache, DeepSeekAPI, StreamError
+from utils.response_cache import ResponseCache
+
+
+def sse(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def delta(text):
+    return sse({"choices": [{"delta": {"content": text}, "finish_reason": None}]})
+
+
+DONE = "data: [DONE]\n\n"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every completion request with the canned SSE events of the server"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for event in self.server.events:
+            self.wfile.write(event.encode())
+            self.wfile.flush()
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.events = []
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def api(stub_server, tmp_path):
+    api = DeepSeekAPI(cache=ConversionCache(str(tmp_path / 'conversions.sqlite3')))
+    api.base_url = f"http://127.0.0.1:{stub_server.server_port}/v1"
+    api.responses = ResponseCache()
+    return api
+
+
+def test_stream_yields_deltas_and_caches_complete_answer(api, stub_server):
+    stub_server.events = [
+        delta("You bought "), delta("3 stocks."),
+        sse({"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": 4}}),
+        DONE,
+    ]
+
+    assert list(api.chat_response_stream("what did I buy?", "context")) == ["You bought ", "3 stocks."]
+    # Served from the cache the second time
+    assert list(api.chat_response_stream("what did I buy?", "context")) == ["You bought 3 stocks."]
+    assert stub_server.requests == 1
+
+
+def test_error_event_mid_stream_raises_and_is_not_cached(api, stub_server):
+    stub_server.events = [delta("You bought "), sse({"error": {"message": "server overloaded"}})]
+
+    received = []
+    with pytest.raises(StreamError, match="server overloaded"):
+        for chunk in api.chat_response_stream("what did I buy?", "context"):
+            received.append(chunk)
+    assert received == ["You bought "]
+
+    stub_server.events = [delta("You bought 3 stocks."), DONE]
+    assert list(api.chat_response_stream("what did I buy?", "context")) == ["You bought 3 stocks."]
+    assert stub_server.requests == 2
+
+
+def test_stream_cut_off_before_done_raises(api, stub_server):
+    stub_server.events = [delta("1. Overall portfolio ")]
+
+    with pytest.raises(StreamError):
+        list(api.chat_response_stream("how am I doing?", "context"))
+    assert len(api.responses._entries) == 0
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from utils.query_engine import QueryEngine
+from utils.schema import to_ledger_frame
+
+TODAY = '2024-05-15'
+
+
+@pytest.fixture(scope='module')
+def lots_ledger():
+    """Ledger with share quantities, so realized P&L is matched by shares"""
+    return pd.DataFrame([
+        ('2024-01-05', 'AAPL', 'BUY', 1000.0, 10.0),
+        ('2024-02-10', 'AAPL', 'SELL', 1200.0, 10.0),
+        ('2024-03-01', 'TSLA', 'BUY', 500.0, 5.0),
+        ('2024-03-15', 'TSLA', 'SELL', 400.0, 5.0),
+        ('2024-04-01', 'QUBT', 'BUY', 300.0, 100.0),
+        ('2024-04-20', 'QUBT', 'SELL', 90.0, 20.0),
+    ], columns=['date', 'security', 'transaction_type', 'amount', 'quantity'])
+
+
+@pytest.fixture(scope='module')
+def paste_ledger():
+    """Ledger from a paste: no quantities, so realized P&L is matched by dollar amounts"""
+    return pd.DataFrame([
+        ('2023-11-02', 'SOUN', 'BUY', 200.0),
+        ('2023-11-20', 'SOUN', 'BUY', 100.0),
+        ('2023-12-01', 'SOUN', 'SELL', 250.0),
+        ('2023-12-05', 'QBTS', 'BUY', 80.0),
+    ], columns=['date', 'security', 'transaction_type', 'amount'])
+
+
+@pytest.fixture(scope='module')
+def engine(lots_ledger):
+    # The chat page passes the ledger in its canonical dtypes
+    return QueryEngine(to_ledger_frame(lots_ledger), today=TODAY)
+
+
+@pytest.mark.parametrize('question, answer', [
+    ("How much did I invest in AAPL?", "You invested $1,000.00 in AAPL across 1 buy order."),
+    ("how much did I spend on tsla", "You invested $500.00 in TSLA across 1 buy order."),
+    ("How much did I invest in total?", "You invested $1,800.00 across 3 buy orders."),
+    ("How much did I sell in March 2024?",
+     "You sold $400.00 between 2024-03-01 and 2024-03-31 across 1 sell order."),
+    ("What is my realized profit?", "Your realized profit is $130.00 (FIFO) from 3 sell orders."),
+    ("What's my P&L on TSLA?", "Your realized loss in TSLA is -$100.00 (FIFO) from 1 sell order."),
+    ("How much profit did I make on qubt and aapl?",
+     "Your realized profit in QUBT, AAPL is $230.00 (FIFO) from 2 sell orders."),
+    ("How many trades did I make in March 2024?", "You made 2 trades between 2024-03-01 and 2024-03-31."),
+    ("How many sells did I make last month?", "You made 1 sell order between 2024-04-01 and 2024-04-30."),
+    ("How many different stocks have I traded?", "You traded 3 different securities."),
+    ("What are my best performing stocks?",
+     "Your best performers by realized P&L (FIFO):\n1. AAPL: $200.00\n2. QUBT: $30.00\n3. TSLA: -$100.00"),
+    ("Which were my worst performers in the past year?",
+     "Your worst performers by realized P&L (FIFO) between 2023-05-15 and 2024-05-15:\n"
+     "1. TSLA: -$100.00\n2. QUBT: $30.00\n3. AAPL: $200.00"),
+])
+def test_answers(engine, question, answer):
+    assert engine.answer(question) == answer
+
+
+@pytest.mark.parametrize('question', [
+    # Names that are not tickers in the ledger: an unscoped total would be wrong
+    "how much did I spend on tesla",
+    "What's my profit on Apple?",
+    "How much did I invest in my TFSA?",
+    "How much did I invest in NVDA?",
+    "How many trades did I make in qubt and nvidia?",
+    # Not a numeric question
+    "Why did TSLA drop?",
+    "Should I sell QUBT?",
+    "What's the weather like?",
+])
+def test_unanswerable_questions_go_to_the_llm(engine, question):
+    assert engine.answer(question) is None
+
+
+def test_dollar_matched_ledger(paste_ledger):
+    engine = QueryEngine(paste_ledger, today=TODAY)
+    # Only the fully consumed first lot realizes a profit (250 - 200); the rest of the sell shrinks the second
+    assert engine.answer("What is my realized P&L on SOUN?") == (
+        "Your realized profit in SOUN is $50.00 (FIFO) from 1 sell order."
+    )
+    assert engine.answer("How much did I invest in 2023?") == (
+        "You invested $380.00 between 2023-01-01 and 2023-12-31 across 3 buy orders."
+    )
+    assert engine.answer("how many buys of soun") == "You made 2 buy orders in SOUN."
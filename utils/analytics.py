@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from utils.downsample import lttb, resample_counts
+from utils.instrumentation import timed
+from utils.positions import realized_pnl
+from utils.valuation import daily_valuation
+
+# Upper bound on points shipped to the browser per time-series chart
+MAX_CHART_POINTS = 1500
+
+
+@dataclass(frozen=True)
+class AnalyticsSnapshot:
+    """Everything the dashboard widgets show, computed once per ledger version.
+
+    Widgets only read from the snapshot; none of its frames should be
+    modified in place because snapshots are shared between sessions.
+    """
+    metrics: dict
+    cumulative_pl: pd.DataFrame
+    allocation: pd.Series
+    daily_counts: pd.DataFrame
+    volume_bucket: str
+    security_pl: pd.Series
+    trade_pl: pd.DataFrame
+    recent_transactions: pd.DataFrame
+    # Daily market value, when the ledger has quantities and prices were given
+    valuation: object = None
+
+
+def prepare_frame(transactions_df):
+    """Copy of the ledger with datetime dates, sorted oldest first"""
+    df = transactions_df.assign(date=pd.to_datetime(transactions_df['date']))
+    return df.sort_values('date', kind='stable')
+
+
+def compute_metrics(df):
+    amounts = df['amount'].to_numpy(dtype=float)
+    return {
+        'total_invested': abs(amounts[(df['transaction_type'] == 'BUY').to_numpy()].sum()),
+        'total_sold': abs(amounts[(df['transaction_type'] == 'SELL').to_numpy()].sum()),
+        'num_transactions': len(df),
+        'unique_securities': df['security'].nunique(),
+    }
+
+
+def cumulative_pl_series(df, max_points=MAX_CHART_POINTS):
+    """Running total of sell amounts (negated), LTTB-downsampled to max_points"""
+    amounts = df['amount'].to_numpy(dtype=float)
+    is_sell = (df['transaction_type'] == 'SELL').to_numpy()
+    series = pd.DataFrame({
+        'date': df['date'].to_numpy(),
+        'cumulative_pl': np.cumsum(np.where(is_sell, -amounts, 0.0)),
+    })
+    return lttb(series, 'date', 'cumulative_pl', max_points)
+
+
+def allocation_series(df):
+    """Absolute net amount per security"""
+    amounts = df['amount'].to_numpy(dtype=float)
+    is_buy = (df['transaction_type'] == 'BUY').to_numpy()
+    net_amount = pd.Series(np.where(is_buy, amounts, -amounts), index=df.index)
+    return net_amount.groupby(df['security']).sum().abs()
+
+
+def daily_counts_frame(df, max_points=MAX_CHART_POINTS):
+    """Transaction counts per day, or per week/month/... when there are too many days"""
+    return resample_counts(df['date'], max_points)
+
+
+def recent_transactions_frame(df, limit=10):
+    """Latest transactions with display-formatted amounts"""
+    recent = df.iloc[::-1].head(limit)[['date', 'transaction_type', 'security', 'amount']].copy()
+    recent['amount'] = [f"${abs(x):,.2f}" for x in recent['amount']]
+    return recent
+
+
+def valuation_series(df, prices, max_points=MAX_CHART_POINTS):
+    """Daily valuation from the price cache, LTTB-downsampled on market value"""
+    valuation = daily_valuation(df, prices)
+    if valuation is None:
+        return None
+    return valuation._replace(daily=lttb(valuation.daily, 'date', 'market_value', max_points))
+
+
+@timed('analytics.build_snapshot')
+def build_snapshot(transactions_df, metrics=None, prices=None):
+    """Compute all dashboard data in one vectorized pass over the ledger"""
+    df = prepare_frame(transactions_df)
+    pnl = realized_pnl(df)
+    daily_counts, volume_bucket = daily_counts_frame(df)
+
+    return AnalyticsSnapshot(
+        metrics=metrics if metrics is not None else compute_metrics(df),
+        cumulative_pl=cumulative_pl_series(df),
+        allocation=allocation_series(df),
+        daily_counts=daily_counts,
+        volume_bucket=volume_bucket,
+        security_pl=pnl.by_security,
+        trade_pl=pnl.trades,
+        recent_transactions=recent_transactions_frame(df),
+        valuation=valuation_series(df, prices) if prices is not None else None,
+    )
+
+
+_snapshots = OrderedDict()
+_snapshots_lock = threading.Lock()
+MAX_SNAPSHOTS = 16
+
+
+def get_snapshot(transactions_df, ledger_fingerprint, metrics=None, prices=None):
+    """Snapshot for a ledger's content (Ledger.content_fingerprint), built on first use and shared by every session"""
+    # New closes in the price cache need a new snapshot too
+    key = ledger_fingerprint if prices is None else (ledger_fingerprint, prices.version())
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is not None:
+            _snapshots.move_to_end(key)
+            return snapshot
+
+    snapshot = build_snapshot(transactions_df, metrics, prices)
+
+    with _snapshots_lock:
+        _snapshots[key] = snapshot
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return snapshot
@@ -1,32 +1,44 @@
 import os
-import requests
+import csv
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
 import json
 import pandas as pd
 from io import StringIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.paste_format import TransactionBlock, iter_blocks
+from utils.http_client import get_http_client
+from utils.response_cache import ResponseCache, get_response_cache
+from utils.ledger import frame_fingerprint
+from utils.schema import to_ledger_frame
+from utils.jobs import JobCancelled, check_cancelled, report_progress
+from utils.instrumentation import record_usage, span, timed
 
-class DeepSeekAPI:
-    def __init__(self):
-        self.api_key = os.environ.get('DEEPSEEK_API_KEY')
-        self.base_url = "https://api.deepseek.com/v1"
+REQUIRED_COLUMNS = ['date', 'security', 'transaction_type', 'amount']
+CHUNK_COLUMNS = ['block'] + REQUIRED_COLUMNS
 
-    def convert_to_csv(self, raw_text):
-        """Convert raw transaction text to CSV format using DeepSeek API"""
-        prompt = """
+CONVERT_MODEL = "deepseek-chat"
+
+CONVERT_PROMPT = """
         Convert the following transaction history into CSV format with EXACTLY these columns in this order:
-        date,security,transaction_type,amount
+        block,date,security,transaction_type,amount
 
         Required formatting:
         1. Column names must be EXACTLY as shown above (case-sensitive)
-        2. date must be YYYY-MM-DD format
-        3. security must be stock symbol only (e.g., AAPL instead of Apple Inc.)
-        4. transaction_type must be either 'BUY' or 'SELL' only
-        5. amount must be a number only (no currency symbols or commas)
+        2. block must be the number from the [Block N] marker the transaction appears under
+        3. date must be YYYY-MM-DD format
+        4. security must be stock symbol only (e.g., AAPL instead of Apple Inc.)
+        5. transaction_type must be either 'BUY' or 'SELL' only
+        6. amount must be a number only (no currency symbols or commas)
 
         Rules:
         - Remove all currency symbols and commas from amounts
         - Remove any option/warrant details from tickers
         - Skip any cancelled or incomplete transactions
-        - Each line must contain exactly these 4 columns
+        - Each line must contain exactly these 5 columns
         - First line must be the header row exactly as shown above
         - Do not include any markdown formatting or explanations
 
@@ -34,125 +46,612 @@ class DeepSeekAPI:
         {raw_text}
 
         Remember: Return ONLY the CSV data, starting with the exact header row shown above.
-        """.format(raw_text=raw_text)
+        """
 
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            data = {
-                "model": "deepseek-chat",
-                "messages": [{
-                    "role": "user",
-                    "content": prompt
-                }],
-                "max_tokens": 2000,
-                "temperature": 0
-            }
-
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
+# Map step of the hierarchical analysis: one slice of the ledger, or a group of earlier summaries
+SUMMARY_PROMPT = """
+        Summarize this part of an investment portfolio's history for a later combined analysis.
+        It covers {period}.
+
+        {totals}
+
+        {content}
+
+        In at most 200 words, cover the securities traded and net amounts bought and sold,
+        visible realized gains or losses, trading patterns (frequency, holding periods,
+        concentration) and notable risks. Keep concrete numbers; do not give advice.
+        """
+
+# Cache entries are only valid for the prompt and model that produced them
+CACHE_VERSION = hashlib.sha256(f"{CONVERT_MODEL}\n{CONVERT_PROMPT}".encode()).hexdigest()[:16]
+
+
+class TruncatedOutputError(Exception):
+    """Raised when the model stops because it ran out of output tokens."""
+
+
+class StreamError(Exception):
+    """Raised when a streamed response fails part-way; the text received so far is not an answer."""
+
+
+def _estimate_tokens(text):
+    """Rough token count, about four characters per token"""
+    return len(text) // 4 + 1
+
+
+def _line_block(block, lines):
+    """Unrecognized piece of a block holding a range of its lines, converted and cached on its own"""
+    return TransactionBlock(date=block.date, date_line=block.date_line, lines=lines, broken=True)
+
+
+def _split_lines(block, token_budget):
+    """Split a block over token_budget into line ranges that fit it.
+
+    Text that is not in the paste format comes out of iter_blocks as one
+    block, however long; recognized entries are a few lines and never split.
+    """
+    if len(block.lines) < 2 or _estimate_tokens(block.text) <= token_budget:
+        return [block]
+    pieces = []
+    current, current_tokens = [], 0
+    for line in block.lines:
+        line_tokens = _estimate_tokens(line)
+        if current and current_tokens + line_tokens > token_budget:
+            pieces.append(_line_block(block, current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+    pieces.append(_line_block(block, current))
+    return pieces
+
+
+def _render_blocks(blocks):
+    """Join blocks back into paste text, each under a numbered marker"""
+    parts = []
+    for number, block in enumerate(blocks, start=1):
+        parts.append(f"[Block {number}]\n{block.text}")
+    return '\n\n'.join(parts)
+
+
+def _csv_row(values):
+    """One CSV line, quoted where needed; cached rows are newline-separated, so values never span lines"""
+    buffer = StringIO()
+    csv.writer(buffer, lineterminator='').writerow(
+        ' '.join(value.split()) if isinstance(value, str) else value for value in values
+    )
+    return buffer.getvalue()
+
+
+def _read_csv(csv_content, columns):
+    """Parse converted CSV text and verify its columns"""
+    df = pd.read_csv(
+        StringIO(csv_content),
+        dtype={
+            'block': str,
+            'date': str,
+            'security': str,
+            'transaction_type': str,
+            'amount': float
+        }
+    )
+
+    # Verify all required columns exist and match exactly
+    if not all(col in df.columns for col in columns):
+        missing = [col for col in columns if col not in df.columns]
+        raise ValueError(f"Missing required columns: {missing}")
+
+    # Verify column order matches exactly
+    if df.columns.tolist() != columns:
+        raise ValueError("Column order does not match required format")
+
+    return df
+
+
+class ConversionCache:
+    """Content-addressed on-disk cache of converted CSV rows per transaction block.
+
+    Entries live in a small SQLite file and are evicted least-recently-used
+    once the stored rows exceed max_bytes.
+    """
+
+    def __init__(self, path=None, max_bytes=64 * 1024 * 1024):
+        if path is None:
+            cache_dir = os.environ.get(
+                'DEEPSEEK_CACHE_DIR',
+                os.path.join(os.path.expanduser('~'), '.cache', 'transaction_tracker')
             )
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, 'conversions.sqlite3')
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, rows TEXT NOT NULL, "
+                "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
 
-            if response.status_code != 200:
-                raise Exception(f"API Error ({response.status_code}): {response.text}")
-
-            response_data = response.json()
-            csv_content = response_data['choices'][0]['message']['content'].strip()
-
-            # Remove any markdown formatting
-            if csv_content.startswith('```') and csv_content.endswith('```'):
-                csv_content = csv_content[3:-3].strip()
-            if csv_content.lower().startswith('csv'):
-                csv_content = csv_content[3:].strip()
-
-            # Validate the header row before parsing
-            first_line = csv_content.split('\n')[0].strip()
-            expected_header = "date,security,transaction_type,amount"
-            if first_line != expected_header:
-                raise ValueError(f"Invalid CSV header. Expected: {expected_header}, Got: {first_line}")
-
-            # Parse CSV with pandas
-            df = pd.read_csv(
-                StringIO(csv_content),
-                dtype={
-                    'date': str,
-                    'security': str,
-                    'transaction_type': str,
-                    'amount': float
-                }
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key(block):
+        """Hash of the normalized block text, scoped to the current prompt version"""
+        return hashlib.sha256(f"{CACHE_VERSION}\n{block.normalized}".encode()).hexdigest()
+
+    def get_many(self, keys):
+        """Return {key: rows} for the keys present in the cache"""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock, self._connect() as conn:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                found.update(conn.execute(
+                    f"SELECT key, rows FROM entries WHERE key IN ({placeholders})", batch
+                ).fetchall())
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE entries SET accessed = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+        return {key: rows.split('\n') if rows else [] for key, rows in found.items()}
+
+    def put_many(self, entries):
+        """Store {key: rows} and evict the least recently used entries over budget"""
+        if not entries:
+            return
+        now = time.time()
+        records = []
+        for key, rows in entries.items():
+            text = '\n'.join(rows)
+            records.append((key, text, len(text) + len(key), now))
+
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, rows, size, accessed) VALUES (?, ?, ?, ?)",
+                records
             )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                evicted = 0
+                stale = []
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                    if total - evicted <= self.max_bytes:
+                        break
+                    stale.append((key,))
+                    evicted += size
+                conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+
+def _period(dates):
+    dates = pd.to_datetime(dates)
+    return f"{dates.min():%Y-%m-%d} to {dates.max():%Y-%m-%d}"
 
-            # Verify all required columns exist and match exactly
-            required_columns = ['date', 'security', 'transaction_type', 'amount']
-            if not all(col in df.columns for col in required_columns):
-                missing = [col for col in required_columns if col not in df.columns]
-                raise ValueError(f"Missing required columns: {missing}")
 
-            # Verify column order matches exactly
-            if df.columns.tolist() != required_columns:
-                raise ValueError("Column order does not match required format")
+def _totals(df):
+    """One-line trade count and bought/sold totals, computed locally so the model need not add up"""
+    amounts = df.groupby('transaction_type')['amount'].sum()
+    return (
+        f"Totals: {len(df)} trades in {df['security'].nunique()} securities, "
+        f"bought ${amounts.get('BUY', 0.0):,.2f}, sold ${amounts.get('SELL', 0.0):,.2f}."
+    )
+
+
+class DeepSeekAPI:
+    def __init__(self, max_workers=4, chunk_token_budget=1500, chunk_max_blocks=40,
+                 chunk_retries=3, retry_backoff=1.0, cache=None,
+                 analysis_token_budget=6000, analysis_group_size=8):
+        self.api_key = os.environ.get('DEEPSEEK_API_KEY')
+        self.base_url = os.environ.get('DEEPSEEK_BASE_URL', "https://api.deepseek.com/v1")
+        self.max_workers = max_workers
+        self.chunk_token_budget = chunk_token_budget
+        self.chunk_max_blocks = chunk_max_blocks
+        self.chunk_retries = chunk_retries
+        self.retry_backoff = retry_backoff
+        self.cache = cache if cache is not None else ConversionCache()
+        # Ledgers rendering to more than analysis_token_budget are analysed map-reduce style
+        self.analysis_token_budget = analysis_token_budget
+        self.analysis_group_size = analysis_group_size
+        self.http = get_http_client()
+        self.responses = get_response_cache()
+
+    @timed('deepseek.convert_to_csv')
+    def convert_to_csv(self, raw_text):
+        """Convert raw transaction text to CSV format using DeepSeek API"""
+        try:
+            blocks = [
+                piece for block in iter_blocks(raw_text.splitlines())
+                for piece in _split_lines(block, self.chunk_token_budget)
+            ]
+            if not blocks:
+                raise ValueError("No transaction data to convert")
+
+            # Only blocks we have not converted before go to the API
+            keys = [self.cache.key(block) for block in blocks]
+            converted = self.cache.get_many(keys)
+            missing = {}
+            for key, block in zip(keys, blocks):
+                if key not in converted:
+                    missing.setdefault(key, block)
+
+            if missing:
+                chunks = self._split_chunks(list(missing.values()))
+                missing_keys = list(missing.keys())
+                chunk_keys = []
+                for chunk in chunks:
+                    chunk_keys.append(missing_keys[:len(chunk)])
+                    missing_keys = missing_keys[len(chunk):]
+
+                total = len(converted) + len(missing)
+                done = len(converted)
+                report_progress(done, total)
+
+                # Convert chunks concurrently; each one is cached as soon as it lands,
+                # so a cancelled or failed conversion resumes where it stopped
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+                    futures = {pool.submit(self._convert_chunk, chunk): index for index, chunk in enumerate(chunks)}
+                    try:
+                        for future in as_completed(futures):
+                            index = futures[future]
+                            fresh = dict(zip(chunk_keys[index], future.result()))
+                            self.cache.put_many(fresh)
+                            converted.update(fresh)
+                            done += len(fresh)
+                            report_progress(done, total)
+                            check_cancelled()
+                    except BaseException:
+                        for pending in futures:
+                            pending.cancel()
+                        raise
+
+            rows = [row for key in keys for row in converted[key]]
+            csv_content = '\n'.join([','.join(REQUIRED_COLUMNS)] + rows)
+            df = to_ledger_frame(_read_csv(csv_content, REQUIRED_COLUMNS))
 
             return csv_content, df
 
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"Error in convert_to_csv: {str(e)}")
             raise Exception(f"Failed to convert transaction data: {str(e)}")
 
-    def analyze_portfolio(self, transactions_df):
-        """Send portfolio data to DeepSeek API for analysis"""
-        prompt = f"""
-        Analyze the following investment portfolio transactions and provide insights:
+    def _split_chunks(self, blocks):
+        """Group transaction blocks into token-budgeted chunks"""
+        chunks = []
+        current, current_tokens = [], 0
 
-        {transactions_df.to_string()}
+        for block in blocks:
+            block_tokens = _estimate_tokens(block.text)
+            if current and (current_tokens + block_tokens > self.chunk_token_budget
+                            or len(current) >= self.chunk_max_blocks):
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(block)
+            current_tokens += block_tokens
 
-        Provide a clear analysis covering:
-        1. Overall portfolio performance
-        2. Key trends in trading patterns
-        3. Risk assessment
-        4. Suggestions for portfolio optimization
+        if current:
+            chunks.append(current)
 
-        Focus on actionable insights and clear metrics.
-        """
+        return chunks
 
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            data = {
-                "model": "deepseek-chat",
-                "messages": [{
-                    "role": "user",
-                    "content": prompt
-                }],
-                "temperature": 0.7,
-                "max_tokens": 1000
-            }
-
-            response = requests.post(
+    def _convert_chunk(self, blocks):
+        """Convert one chunk into a list of CSV rows per block, splitting it if the output is truncated.
+
+        Only malformed model output is retried here: rate limits, server
+        errors and dropped connections are already retried by the HTTP
+        client, and retrying them again would multiply the attempts.
+        """
+        last_error = None
+        for attempt in range(self.chunk_retries):
+            try:
+                return self._request_csv(blocks)
+            except TruncatedOutputError:
+                if len(blocks) == 1:
+                    block = blocks[0]
+                    if len(block.lines) < 2:
+                        raise
+                    # One long block: convert each half of its lines and join the rows
+                    middle = len(block.lines) // 2
+                    halves = [_line_block(block, block.lines[:middle]), _line_block(block, block.lines[middle:])]
+                    return [[row for half in halves for row in self._convert_chunk([half])[0]]]
+                # Halve the chunk so each half fits in the output budget
+                middle = len(blocks) // 2
+                return self._convert_chunk(blocks[:middle]) + self._convert_chunk(blocks[middle:])
+            except ValueError as e:
+                last_error = e
+                if attempt < self.chunk_retries - 1:
+                    time.sleep(self.retry_backoff * (2 ** attempt))
+
+        raise Exception(f"Chunk failed after {self.chunk_retries} attempts: {str(last_error)}")
+
+    def _request_csv(self, blocks):
+        """Send one conversion request and validate the returned CSV"""
+        prompt = CONVERT_PROMPT.format(raw_text=_render_blocks(blocks))
+
+        data = {
+            "model": CONVERT_MODEL,
+            "messages": [{
+                "role": "user",
+                "content": prompt
+            }],
+            "max_tokens": 2000,
+            "temperature": 0
+        }
+
+        with span('deepseek.request', operation='convert'):
+            response = self.http.post(
                 f"{self.base_url}/chat/completions",
-                headers=headers,
+                headers=self._headers(),
                 json=data,
                 timeout=30
             )
-            response.raise_for_status()
 
-            return response.json()['choices'][0]['message']['content']
+        if response.status_code != 200:
+            raise Exception(f"API Error ({response.status_code}): {response.text}")
+
+        response_data = response.json()
+        record_usage(response_data.get('usage'), 'convert')
+        choice = response_data['choices'][0]
+        if choice.get('finish_reason') == 'length':
+            raise TruncatedOutputError("Model output was truncated")
+        csv_content = choice['message']['content'].strip()
+
+        # Remove any markdown formatting
+        if csv_content.startswith('```') and csv_content.endswith('```'):
+            csv_content = csv_content[3:-3].strip()
+        if csv_content.lower().startswith('csv'):
+            csv_content = csv_content[3:].strip()
+
+        # Validate the header row before parsing
+        first_line = csv_content.split('\n')[0].strip()
+        expected_header = ",".join(CHUNK_COLUMNS)
+        if first_line != expected_header:
+            raise ValueError(f"Invalid CSV header. Expected: {expected_header}, Got: {first_line}")
+
+        df = _read_csv(csv_content, CHUNK_COLUMNS)
+
+        # Route each row back to the block it came from
+        block_numbers = pd.to_numeric(df['block'], errors='coerce')
+        if block_numbers.isna().any() or not block_numbers.between(1, len(blocks)).all():
+            raise ValueError("Rows reference unknown block numbers")
+
+        rows_by_block = [[] for _ in blocks]
+        for number, row in zip(block_numbers.astype(int), df[REQUIRED_COLUMNS].itertuples(index=False)):
+            rows_by_block[number - 1].append(
+                _csv_row([row.date, row.security, row.transaction_type, repr(float(row.amount))])
+            )
+        return rows_by_block
+
+    @timed('deepseek.analyze_portfolio')
+    def analyze_portfolio(self, transactions_df, ledger_fingerprint=None):
+        """Send portfolio data to DeepSeek API for analysis"""
+        try:
+            # Callers holding a Ledger pass its memoized content_fingerprint instead of hashing the frame
+            if ledger_fingerprint is None:
+                ledger_fingerprint = frame_fingerprint(transactions_df)
+            key = self._response_key('analysis', ledger_fingerprint, '', 0.7, 1000)
+            cached = self.responses.get(key)
+            if cached is not None:
+                return cached
+
+            analysis = self._complete(self._analysis_prompt(transactions_df), temperature=0.7, max_tokens=1000,
+                                      operation='analysis')
+            self.responses.put(key, analysis)
+            return analysis
 
         except Exception as e:
             print(f"Error in portfolio analysis: {str(e)}")
             return f"Error analyzing portfolio: {str(e)}"
 
-    def chat_response(self, user_question, context):
+    @timed('deepseek.analyze_portfolio_stream')
+    def analyze_portfolio_stream(self, transactions_df, ledger_fingerprint=None):
+        """Stream the portfolio analysis as text deltas while DeepSeek generates it"""
+        try:
+            # Callers holding a Ledger pass its memoized content_fingerprint instead of hashing the frame
+            if ledger_fingerprint is None:
+                ledger_fingerprint = frame_fingerprint(transactions_df)
+            key = self._response_key('analysis', ledger_fingerprint, '', 0.7, 1000)
+            # Building the prompt may summarize the ledger first, so look for a cached answer before
+            cached = self.responses.get(key)
+            if cached is not None:
+                yield cached
+                return
+            yield from self._cached_stream(key, self._analysis_prompt(transactions_df), temperature=0.7, max_tokens=1000,
+                                           operation='analysis')
+
+        except Exception as e:
+            # Raised rather than yielded, so the error never reads as part of the answer
+            print(f"Error in portfolio analysis: {str(e)}")
+            raise
+
+    @timed('deepseek.chat_response')
+    def chat_response(self, user_question, context, ledger_fingerprint=None):
         """Get response for user questions about their portfolio"""
-        prompt = f"""
+        try:
+            key = self._chat_key(user_question, context, ledger_fingerprint)
+            cached = self.responses.get(key)
+            if cached is not None:
+                return cached
+
+            answer = self._complete(self._chat_prompt(user_question, context), temperature=0.5, max_tokens=1000,
+                                    operation='chat')
+            self.responses.put(key, answer)
+            return answer
+
+        except Exception as e:
+            print(f"Error processing question: {str(e)}")
+            return f"Error processing question: {str(e)}"
+
+    @timed('deepseek.chat_response_stream')
+    def chat_response_stream(self, user_question, context, ledger_fingerprint=None):
+        """Stream the answer to a portfolio question as text deltas"""
+        try:
+            key = self._chat_key(user_question, context, ledger_fingerprint)
+            yield from self._cached_stream(key, self._chat_prompt(user_question, context), temperature=0.5, max_tokens=1000,
+                                           operation='chat')
+
+        except Exception as e:
+            print(f"Error processing question: {str(e)}")
+            raise
+
+    def _response_key(self, kind, ledger_fingerprint, prompt, temperature, max_tokens):
+        return ResponseCache.make_key(
+            ledger_fingerprint, kind, prompt,
+            model="deepseek-chat", temperature=temperature, max_tokens=max_tokens
+        )
+
+    def _chat_key(self, user_question, context, ledger_fingerprint):
+        # Without a ledger fingerprint the context itself identifies the data
+        if ledger_fingerprint is None:
+            ledger_fingerprint = hashlib.sha256(context.encode()).hexdigest()
+        return self._response_key('chat', ledger_fingerprint, user_question, 0.5, 1000)
+
+    def _cached_stream(self, key, prompt, temperature, max_tokens, operation='chat'):
+        """Replay a cached response, or stream a fresh one and cache it once complete.
+
+        A stream that fails part-way raises before anything is cached.
+        """
+        cached = self.responses.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        for delta in self._stream(prompt, temperature, max_tokens, operation):
+            parts.append(delta)
+            yield delta
+        self.responses.put(key, ''.join(parts))
+
+    def _analysis_prompt(self, transactions_df):
+        """Four-section analysis prompt over the whole ledger, or over summaries of its slices when it is too big"""
+        # Estimated from the first rows; rendering a large ledger just to measure it is slow
+        sample = transactions_df.head(100)
+        estimated = _estimate_tokens(sample.to_string()) * len(transactions_df) / max(len(sample), 1)
+        if estimated <= self.analysis_token_budget:
+            portfolio = transactions_df.to_string()
+        else:
+            summaries = self._summarize_ledger(transactions_df)
+            portfolio = (
+                f"The history covers {_period(transactions_df['date'])}. {_totals(transactions_df)}\n\n"
+                "It is too long to show in full; these are summaries of consecutive periods:\n\n"
+                + '\n\n'.join(summaries)
+            )
+
+        return f"""
+        Analyze the following investment portfolio transactions and provide insights:
+
+        {portfolio}
+
+        Provide a clear analysis covering:
+        1. Overall portfolio performance
+        2. Key trends in trading patterns
+        3. Risk assessment
+        4. Suggestions for portfolio optimization
+
+        Focus on actionable insights and clear metrics.
+        """
+
+    @timed('deepseek.summarize_ledger')
+    def _summarize_ledger(self, transactions_df):
+        """Summaries of consecutive ledger slices, merged in groups until at most analysis_group_size remain"""
+        slices = self._split_ledger(transactions_df)
+        summaries = self._summarize_all([
+            (_period(piece['date']), _totals(piece), piece.to_csv(index=False))
+            for piece in slices
+        ])
+
+        # Tree reduction: each level cuts the summary count by analysis_group_size
+        while len(summaries) > self.analysis_group_size:
+            groups = [
+                (slices[start:start + self.analysis_group_size], summaries[start:start + self.analysis_group_size])
+                for start in range(0, len(summaries), self.analysis_group_size)
+            ]
+            merged_slices = [pd.concat(group_slices) for group_slices, _ in groups]
+            summaries = self._summarize_all([
+                (_period(merged['date']), _totals(merged), '\n\n'.join(group_summaries))
+                for merged, (_, group_summaries) in zip(merged_slices, groups)
+            ])
+            slices = merged_slices
+
+        return [f"{_period(piece['date'])}:\n{summary}" for piece, summary in zip(slices, summaries)]
+
+    def _split_ledger(self, transactions_df):
+        """Split the ledger, oldest first, into runs of whole months that each fit the token budget.
+
+        Months are only split when a single month is over budget. Slices
+        are filled from the oldest month, so appending newer trades leaves
+        earlier slices (and their cached summaries) unchanged.
+        """
+        columns = [column for column in ('date', 'security', 'transaction_type', 'amount', 'quantity', 'account')
+                   if column in transactions_df.columns]
+        ordered = transactions_df[columns].sort_values('date', kind='stable').reset_index(drop=True)
+        row_tokens = ordered.to_csv(index=False, header=False).splitlines()
+        row_tokens = [_estimate_tokens(row) for row in row_tokens]
+        budget = self.analysis_token_budget
+
+        slices = []
+        start, tokens = 0, 0
+        for _, month in ordered.groupby(pd.to_datetime(ordered['date']).dt.to_period('M'), sort=True):
+            month_start = month.index[0]
+            month_tokens = sum(row_tokens[month.index[0]:month.index[-1] + 1])
+            if tokens and tokens + month_tokens > budget:
+                slices.append(ordered.iloc[start:month_start])
+                start, tokens = month_start, 0
+            if month_tokens > budget:
+                # One oversized month becomes several row slices
+                for row in range(month.index[0], month.index[-1] + 1):
+                    if tokens and tokens + row_tokens[row] > budget:
+                        slices.append(ordered.iloc[start:row])
+                        start, tokens = row, 0
+                    tokens += row_tokens[row]
+            else:
+                tokens += month_tokens
+        if start < len(ordered):
+            slices.append(ordered.iloc[start:])
+        return slices
+
+    def _summarize_all(self, parts):
+        """Summarize (period, totals, content) parts concurrently, reusing cached summaries"""
+        summaries = [None] * len(parts)
+        pending = {}
+        for index, (period, totals, content) in enumerate(parts):
+            prompt = SUMMARY_PROMPT.format(period=period, totals=totals, content=content)
+            key = self._response_key('analysis_part', hashlib.sha256(prompt.encode()).hexdigest(), '', 0, 400)
+            cached = self.responses.get(key)
+            if cached is not None:
+                summaries[index] = cached
+            else:
+                pending[index] = (key, prompt)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending))) as pool:
+                futures = {
+                    pool.submit(self._complete, prompt, temperature=0, max_tokens=400,
+                                operation='analysis_summary'): (index, key)
+                    for index, (key, prompt) in pending.items()
+                }
+                for future in as_completed(futures):
+                    index, key = futures[future]
+                    summaries[index] = future.result()
+                    self.responses.put(key, summaries[index])
+
+        return summaries
+
+    def _chat_prompt(self, user_question, context):
+        return f"""
         Context about the portfolio:
         {context}
 
@@ -162,32 +661,87 @@ class DeepSeekAPI:
         Focus on actionable insights and concrete numbers when available.
         """
 
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            data = {
-                "model": "deepseek-chat",
-                "messages": [{
-                    "role": "user",
-                    "content": prompt
-                }],
-                "temperature": 0.5,
-                "max_tokens": 1000
-            }
-
-            response = requests.post(
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _payload(self, prompt, temperature, max_tokens, stream=False):
+        data = {
+            "model": "deepseek-chat",
+            "messages": [{
+                "role": "user",
+                "content": prompt
+            }],
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if stream:
+            data["stream"] = True
+            # Ask for a final chunk carrying the token usage
+            data["stream_options"] = {"include_usage": True}
+        return data
+
+    def _complete(self, prompt, temperature, max_tokens, operation='chat'):
+        """Blocking completion, returns the full message text"""
+        with span('deepseek.request', operation=operation):
+            response = self.http.post(
                 f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=data,
+                headers=self._headers(),
+                json=self._payload(prompt, temperature, max_tokens),
                 timeout=30
             )
-            response.raise_for_status()
+        response.raise_for_status()
 
-            return response.json()['choices'][0]['message']['content']
+        response_data = response.json()
+        record_usage(response_data.get('usage'), operation)
+        return response_data['choices'][0]['message']['content']
 
-        except Exception as e:
-            print(f"Error processing question: {str(e)}")
-            return f"Error processing question: {str(e)}"
\ No newline at end of file
+    def _stream(self, prompt, temperature, max_tokens, operation='chat'):
+        """Streamed (SSE) completion, yields content deltas as they arrive.
+
+        Raises StreamError on an error event or when the stream ends before
+        its [DONE] marker.
+        """
+        with self.http.stream_post(
+            f"{self.base_url}/chat/completions",
+            headers=self._headers(),
+            json=self._payload(prompt, temperature, max_tokens, stream=True),
+            timeout=30
+        ) as response:
+            response.raise_for_status()
+
+            for line in response.iter_lines(decode_unicode=True):
+                # Server-sent events: "data: {json}" lines, ending with "data: [DONE]"
+                if not line or not line.startswith('data:'):
+                    continue
+                payload = line[len('data:'):].strip()
+                if payload == '[DONE]':
+                    return
+
+                event = json.loads(payload)
+                error = event.get('error')
+                if error:
+                    message = error.get('message', error) if isinstance(error, dict) else error
+                    raise StreamError(f"Stream failed: {message}")
+                record_usage(event.get('usage'), operation)
+                choices = event.get('choices') or [{}]
+                delta = choices[0].get('delta', {}).get('content')
+                if delta:
+                    yield delta
+
+        raise StreamError("Stream ended before the response was complete")
+
+
+_default_api = None
+_default_api_lock = threading.Lock()
+
+
+def get_deepseek_api():
+    """Process-wide DeepSeekAPI, so pages and reruns share its conversion cache and HTTP pool"""
+    global _default_api
+    with _default_api_lock:
+        if _default_api is None:
+            _default_api = DeepSeekAPI()
+        return _default_api
@@ -0,0 +1,205 @@
+import re
+
+import pandas as pd
+
+from utils.positions import realized_pnl
+
+MONTHS = {
+    name: number for number, name in enumerate(
+        ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+         'august', 'september', 'october', 'november', 'december'], start=1
+    )
+}
+MONTHS.update({name[:3]: number for name, number in list(MONTHS.items())})
+
+MONTH_RE = re.compile(r'\b(' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\b(?:\s+(\d{4}))?')
+YEAR_RE = re.compile(r'\b(20\d{2}|19\d{2})\b')
+ISO_DATE_RE = re.compile(r'\b(\d{4}-\d{2}-\d{2})\b')
+RELATIVE_RE = re.compile(r'\b(last|this|past)\s+(week|month|year)\b')
+BUY_RE = re.compile(r'\b(buy|buys|bought|purchas\w*|invest\w*)\b')
+SELL_RE = re.compile(r'\b(sell|sells|sold|sale|sales)\b')
+WORD_RE = re.compile(r'[A-Za-z][A-Za-z0-9.\-]*')
+
+# Common words that are also tickers; only match them when written in capitals
+AMBIGUOUS_TICKERS = {'A', 'ALL', 'ARE', 'BE', 'CAN', 'FOR', 'IT', 'NOW', 'ON', 'ONE', 'SO', 'T', 'ANY', 'HAS', 'AM', 'AN', 'MY', 'AT'}
+
+
+def estimate_tokens(text):
+    """Rough token count, about four characters per token"""
+    return len(text) // 4 + 1
+
+
+def parse_question_filters(question, securities, today=None):
+    """Extract the tickers, date range and transaction type a question refers to.
+
+    Returns a dict with 'securities' (list), 'start'/'end' (Timestamps or
+    None) and 'transaction_type' ('BUY', 'SELL' or None).
+    """
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    lowered = question.lower()
+    known = {str(security).upper(): security for security in securities}
+
+    mentioned = []
+    for word in WORD_RE.findall(question):
+        upper = word.upper()
+        if upper not in known or known[upper] in mentioned:
+            continue
+        if upper in AMBIGUOUS_TICKERS and word != upper:
+            continue
+        mentioned.append(known[upper])
+
+    start = end = None
+    iso_dates = ISO_DATE_RE.findall(question)
+    relative = RELATIVE_RE.search(lowered)
+    month = MONTH_RE.search(lowered)
+    year = YEAR_RE.search(lowered)
+
+    if iso_dates:
+        dates = sorted(pd.to_datetime(iso_dates, errors='coerce').dropna())
+        if dates:
+            start, end = dates[0], dates[-1]
+    elif relative:
+        which, unit = relative.groups()
+        if which == 'past':
+            # Trailing window ending today
+            end = today
+            start = today - {'week': pd.DateOffset(weeks=1), 'month': pd.DateOffset(months=1),
+                             'year': pd.DateOffset(years=1)}[unit]
+        elif unit == 'week':
+            start = today - pd.Timedelta(days=today.weekday())
+            if which == 'last':
+                start -= pd.Timedelta(weeks=1)
+            end = start + pd.Timedelta(days=6)
+        elif unit == 'month':
+            start = today.replace(day=1)
+            if which == 'last':
+                start -= pd.DateOffset(months=1)
+            end = start + pd.offsets.MonthEnd(0)
+        else:
+            start = today.replace(month=1, day=1)
+            if which == 'last':
+                start -= pd.DateOffset(years=1)
+            end = start.replace(month=12, day=31)
+    elif month:
+        name, month_year = month.groups()
+        # "may" is too common a word to mean the month without a year
+        if name != 'may' or month_year:
+            number = MONTHS[name]
+            if month_year:
+                year_value = int(month_year)
+            elif year:
+                year_value = int(year.group(1))
+            else:
+                # Most recent occurrence of that month
+                year_value = today.year if number <= today.month else today.year - 1
+            start = pd.Timestamp(year=year_value, month=number, day=1)
+            end = start + pd.offsets.MonthEnd(0)
+    if start is None and year:
+        start = pd.Timestamp(year=int(year.group(1)), month=1, day=1)
+        end = start.replace(month=12, day=31)
+
+    if BUY_RE.search(lowered) and not SELL_RE.search(lowered):
+        transaction_type = 'BUY'
+    elif SELL_RE.search(lowered) and not BUY_RE.search(lowered):
+        transaction_type = 'SELL'
+    else:
+        transaction_type = None
+
+    return {
+        'securities': mentioned,
+        'start': start,
+        'end': end,
+        'transaction_type': transaction_type,
+    }
+
+
+class ChatContextBuilder:
+    """Builds a bounded-size prompt context for chat questions.
+
+    The portfolio summary (holdings, realized P&L per security, monthly
+    totals) is computed once per ledger. Each question then adds only the
+    rows it refers to, newest first, until the token budget is used up.
+    """
+
+    def __init__(self, transactions_df, token_budget=1500, max_summary_securities=25, max_summary_months=24):
+        self.token_budget = token_budget
+        self.df = transactions_df.assign(date=pd.to_datetime(transactions_df['date']))
+        self.df = self.df.sort_values('date', ascending=False, kind='stable')
+        self.securities = self.df['security'].dropna().unique()
+        self.summary = self._build_summary(max_summary_securities, max_summary_months)
+
+    def memory_usage(self, deep=True):
+        """Approximate bytes held: the sorted frame and the summary text"""
+        return int(self.df.memory_usage(deep=deep).sum()) + len(self.summary)
+
+    def _build_summary(self, max_securities, max_months):
+        df = self.df
+        signed = df['amount'].where(df['transaction_type'] == 'BUY', -df['amount'])
+        net_invested = signed.groupby(df['security']).sum()
+        realized = realized_pnl(df).by_security
+
+        per_security = pd.DataFrame({'net_invested': net_invested, 'realized_pl': realized}).fillna(0)
+        per_security = per_security.reindex(
+            per_security['net_invested'].abs().sort_values(ascending=False).index
+        )
+
+        monthly = (
+            df.pivot_table(index=df['date'].dt.to_period('M'), columns='transaction_type',
+                           values='amount', aggfunc='sum', fill_value=0)
+            .sort_index()
+            .tail(max_months)
+        )
+
+        buys = df.loc[df['transaction_type'] == 'BUY', 'amount'].sum()
+        sells = df.loc[df['transaction_type'] == 'SELL', 'amount'].sum()
+        lines = [
+            f"Transactions: {len(df)} from {df['date'].min():%Y-%m-%d} to {df['date'].max():%Y-%m-%d}",
+            f"Total bought: ${buys:,.2f}; total sold: ${sells:,.2f}; "
+            f"realized P&L (FIFO): ${realized.sum():,.2f}",
+            "",
+            "Holdings (security, net invested, realized P&L):",
+        ]
+        for security, row in per_security.head(max_securities).iterrows():
+            lines.append(f"{security}, {row['net_invested']:.2f}, {row['realized_pl']:.2f}")
+        if len(per_security) > max_securities:
+            lines.append(f"... and {len(per_security) - max_securities} more securities")
+
+        lines += ["", "Monthly totals (month, bought, sold):"]
+        for month, row in monthly.iterrows():
+            lines.append(f"{month}, {row.get('BUY', 0):.2f}, {row.get('SELL', 0):.2f}")
+
+        return '\n'.join(lines)
+
+    def relevant_rows(self, question):
+        """Rows matching the tickers, dates and transaction type mentioned in the question"""
+        filters = parse_question_filters(question, self.securities)
+        df = self.df
+        mask = pd.Series(True, index=df.index)
+        if filters['securities']:
+            mask &= df['security'].isin(filters['securities'])
+        if filters['start'] is not None:
+            mask &= df['date'].between(filters['start'], filters['end'])
+        if filters['transaction_type']:
+            mask &= df['transaction_type'] == filters['transaction_type']
+        return df[mask]
+
+    def build(self, question):
+        """Summary plus as many relevant rows as fit in the token budget"""
+        rows = self.relevant_rows(question)
+        remaining = self.token_budget - estimate_tokens(self.summary) - 20
+
+        row_lines = []
+        for row in rows.itertuples(index=False):
+            line = f"{row.date:%Y-%m-%d},{row.security},{row.transaction_type},{row.amount:.2f}"
+            remaining -= estimate_tokens(line)
+            if remaining < 0:
+                break
+            row_lines.append(line)
+
+        parts = [self.summary, ""]
+        if row_lines:
+            header = f"Relevant transactions ({len(row_lines)} of {len(rows)} matching, newest first):"
+            parts += [header, "date,security,transaction_type,amount"] + row_lines
+        else:
+            parts.append("No individual transactions matched the question.")
+        return '\n'.join(parts)
@@ -1,30 +1,233 @@
 import pandas as pd
 from datetime import datetime
 import re
-from utils.api import DeepSeekAPI
+import threading
+from utils.api import get_deepseek_api
+from collections import Counter
+import numpy as np
+from utils.paste_format import iter_blocks, fingerprint_blocks, fingerprint_identities
+from utils.schema import LEDGER_COLUMNS, to_ledger_frame
+from utils.jobs import JobCancelled
+from utils.instrumentation import timed
+
+COLUMNS = ['date', 'security', 'transaction_type', 'amount']
+# Also known for every block the local parser recognizes
+BLOCK_COLUMNS = COLUMNS + ['account', 'details']
+
+# Columns of the Wealthsimple CSV export used for ingestion
+EXPORT_COLUMNS = [
+    'Transaction Date', 'Ticker', 'Details', 'Transaction Type', 'Sub-Type',
+    'Account', 'Amount (CAD)', 'Status', 'Buy/Sell', 'Filled Quantity', 'Fees',
+    'Exchange Rate'
+]
+
+# "2 contracts x $0.40 USD", "0.565 shares x $39.7524 CAD"
+FILLED_QUANTITY_RE = r'^\s*([\d,]*\.?\d+)\s+(?:share|contract)'
+# "2.00 USD"
+FEES_RE = r'^\s*([\d,]*\.?\d+)\s*([A-Z]{3})?'
 
 class WealthSimpleParser:
-    def __init__(self):
-        self.api = DeepSeekAPI()
+    def __init__(self, api=None):
+        self.api = api if api is not None else get_deepseek_api()
+
+    def parse_local(self, raw_text):
+        """Parse the known paste layout locally.
+
+        Returns the recognized rows and the blocks the state machine could
+        not make sense of, which still need the LLM.
+        """
+        return self._parse_blocks(iter_blocks(raw_text.splitlines()))
+
+    def _parse_blocks(self, blocks):
+        rows = []
+        unrecognized = []
+        for block in blocks:
+            if not block.recognized:
+                unrecognized.append(block)
+            elif block.executed:
+                rows.append((block.date, block.security, block.transaction_type, block.amount,
+                             block.account, block.details))
+        return rows, unrecognized
+
+    def _convert_blocks(self, blocks, use_api=True):
+        """Convert blocks to the canonical frame, only calling DeepSeek for unrecognized ones.
+
+        With use_api=False unrecognized blocks are dropped instead.
+        """
+        rows, unrecognized = self._parse_blocks(blocks)
+        df = pd.DataFrame(rows, columns=BLOCK_COLUMNS)
+
+        if unrecognized and use_api:
+            fallback_text = '\n\n'.join(block.text for block in unrecognized)
+            _, fallback_df = self.api.convert_to_csv(fallback_text)
+            # Back to plain values so the concat does not mix categoricals
+            df = pd.concat([df, fallback_df.astype({'security': object, 'transaction_type': object})],
+                           ignore_index=True)
+            # Keep the paste's newest-first ordering
+            df = df.assign(date=pd.to_datetime(df['date'], format='ISO8601'))
+            df = df.sort_values('date', ascending=False, kind='stable').reset_index(drop=True)
+
+        return to_ledger_frame(df)
+
+    @timed('parser.convert')
+    def convert(self, raw_text):
+        """Convert raw transaction text to CSV, only calling DeepSeek for unrecognized blocks."""
+        try:
+            df = self._convert_blocks(iter_blocks(raw_text.splitlines()))
 
+            if df.empty:
+                raise ValueError("No transactions found in the input")
+
+            csv_content = df.to_csv(index=False).strip()
+            return csv_content, df
+
+        except Exception as e:
+            print(f"Error in convert: {str(e)}")
+            raise Exception(f"Failed to convert transaction data: {str(e)}")
+
+    @timed('parser.append')
+    def append(self, raw_text, ledger, use_api=True):
+        """Convert only transactions not already in the ledger and merge them in.
+
+        Returns the number of new rows added. With use_api=False, blocks
+        the local parser does not recognize are skipped and left out of
+        the ledger's fingerprints, so a later run with the API picks them up.
+        """
+        try:
+            blocks = list(iter_blocks(raw_text.splitlines()))
+            fingerprints = fingerprint_blocks(blocks)
+
+            seen = ledger.fingerprints.contains(fingerprints)
+            new_blocks = []
+            new_fingerprints = []
+            for block, fingerprint, already_seen in zip(blocks, fingerprints, seen):
+                if not use_api and not block.recognized:
+                    continue
+                if not already_seen:
+                    new_blocks.append(block)
+                    new_fingerprints.append(fingerprint)
+
+            if not new_blocks:
+                return 0
+
+            new_df = self._convert_blocks(new_blocks, use_api)
+            ledger.append(new_df, new_fingerprints)
+            return len(new_df)
+
+        except JobCancelled:
+            raise
+        except Exception as e:
+            print(f"Error in append: {str(e)}")
+            raise Exception(f"Failed to append transaction data: {str(e)}")
+
+    @timed('parser.read_csv_export')
+    def read_csv_export(self, source, chunksize=100_000):
+        """Read a Wealthsimple CSV export into the canonical frame without calling the API.
+
+        The file is read in chunks with the vectorized C parser. Only
+        Completed buy/sell rows are kept. Returns the frame and one ingestion
+        fingerprint per kept row, compatible with the paste fingerprints.
+        Unlike the paste, the export also gives the filled quantity and fees
+        (converted to CAD) needed by the position books.
+        """
+        frames = []
+        fingerprints = []
+        seen = Counter()
+
+        reader = pd.read_csv(
+            source,
+            usecols=lambda column: column in EXPORT_COLUMNS,
+            dtype=str,
+            keep_default_na=False,
+            chunksize=chunksize
+        )
+        for chunk in reader:
+            missing = [col for col in ['Transaction Date', 'Ticker', 'Amount (CAD)', 'Status'] if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"Not a Wealthsimple export, missing columns: {missing}")
+            for col in EXPORT_COLUMNS:
+                if col not in chunk.columns:
+                    chunk[col] = ''
+
+            amount = pd.to_numeric(chunk['Amount (CAD)'].str.replace(',', '', regex=False), errors='coerce')
+            completed = chunk['Status'].str.lower().isin(['completed', 'filled'])
+
+            # Same identity fields as a pasted block, so both sources de-duplicate against each other
+            identities = (
+                chunk['Transaction Date'] + '|' + chunk['Ticker'] + '|' + chunk['Details'] + '|'
+                + chunk['Transaction Type'].str.lower() + '|' + chunk['Account'] + '|'
+                + pd.Series(np.char.mod('%.2f', amount.fillna(0).to_numpy()), index=chunk.index)
+                + '|CAD|' + chunk['Status'].str.lower().where(~completed, '')
+            )
+            chunk_fingerprints = np.array(fingerprint_identities(identities, seen), dtype=object)
+
+            # Prefer the Buy/Sell column, then the sub-type and order type
+            side_text = (chunk['Buy/Sell'] + ' ' + chunk['Sub-Type'] + ' ' + chunk['Transaction Type']).str.lower()
+            side_text = side_text.str.strip()
+            transaction_type = np.select(
+                [side_text.str.startswith('buy'), side_text.str.startswith('sell'),
+                 side_text.str.contains('buy', regex=False), side_text.str.contains('sell', regex=False)],
+                ['BUY', 'SELL', 'BUY', 'SELL'],
+                default=''
+            )
+
+            quantity = pd.to_numeric(
+                chunk['Filled Quantity'].str.extract(FILLED_QUANTITY_RE, expand=False).str.replace(',', '', regex=False),
+                errors='coerce'
+            )
+            fee_parts = chunk['Fees'].str.extract(FEES_RE)
+            fees = pd.to_numeric(fee_parts[0].str.replace(',', '', regex=False), errors='coerce').fillna(0.0)
+            exchange_rate = pd.to_numeric(chunk['Exchange Rate'], errors='coerce').fillna(1.0)
+            fees = fees.where(fee_parts[1].fillna('CAD') == 'CAD', fees * exchange_rate)
+
+            keep = (completed & (transaction_type != '') & amount.notna() & (chunk['Ticker'] != '')).to_numpy()
+            frames.append(pd.DataFrame({
+                'date': chunk['Transaction Date'].to_numpy()[keep],
+                'security': chunk['Ticker'].to_numpy()[keep],
+                'transaction_type': transaction_type[keep],
+                'amount': amount.to_numpy()[keep],
+                'account': chunk['Account'].to_numpy()[keep],
+                'details': chunk['Details'].to_numpy()[keep],
+                'quantity': quantity.to_numpy()[keep],
+                'fees': fees.round(2).to_numpy()[keep],
+            }))
+            fingerprints.extend(chunk_fingerprints[keep])
+
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=LEDGER_COLUMNS)
+        return to_ledger_frame(df), fingerprints
+
+    def append_csv_export(self, source, ledger):
+        """Merge the rows of a CSV export that are not already in the ledger.
+
+        Returns the number of new rows added.
+        """
+        try:
+            df, fingerprints = self.read_csv_export(source)
+            is_new = ~ledger.fingerprints.contains(fingerprints)
+            if not is_new.any():
+                return 0
+
+            new_fingerprints = [fingerprint for fingerprint, new in zip(fingerprints, is_new) if new]
+            ledger.append(df[is_new], new_fingerprints)
+            return int(is_new.sum())
+
+        except Exception as e:
+            print(f"Error in append_csv_export: {str(e)}")
+            raise Exception(f"Failed to import CSV export: {str(e)}")
+
+    @timed('parser.parse_transactions')
     def parse_transactions(self, raw_text):
         """Parse Wealthsimple transaction history from raw text."""
         try:
-            # Get CSV content and DataFrame from API
-            csv_content, df = self.api.convert_to_csv(raw_text)
+            # Get CSV content and DataFrame, falling back to the API when needed
+            csv_content, df = self.convert(raw_text)
 
             # Basic validation of the DataFrame
             if df is None or df.empty:
                 raise ValueError("No data was parsed from the input")
 
-            # Convert date strings to datetime objects
-            df['date'] = pd.to_datetime(df['date'])
-
-            # Ensure transaction_type is uppercase
-            df['transaction_type'] = df['transaction_type'].str.upper()
-
-            # Ensure amount is numeric
-            df['amount'] = pd.to_numeric(df['amount'], errors='coerce')
+            # Canonical dtypes: datetime64 dates, categorical tickers and sides, float amounts
+            df = to_ledger_frame(df)
 
             # Final validation
             required_columns = ['date', 'security', 'transaction_type', 'amount']
@@ -38,6 +241,7 @@ class WealthSimpleParser:
             print(f"Error in parse_transactions: {str(e)}")
             raise Exception(f"Failed to parse transactions: {str(e)}")
 
+    @timed('parser.calculate_portfolio_metrics')
     def calculate_portfolio_metrics(self, df):
         """Calculate key portfolio metrics from transaction data."""
         try:
@@ -58,4 +262,17 @@ class WealthSimpleParser:
 
         except Exception as e:
             print(f"Error calculating metrics: {str(e)}")
-            raise Exception(f"Failed to calculate metrics: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to calculate metrics: {str(e)}")
+
+
+_default_parser = None
+_default_parser_lock = threading.Lock()
+
+
+def get_parser():
+    """Process-wide WealthSimpleParser shared by every page and session"""
+    global _default_parser
+    with _default_parser_lock:
+        if _default_parser is None:
+            _default_parser = WealthSimpleParser()
+        return _default_parser
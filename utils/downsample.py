@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+# Bucket sizes tried, finest first, when resampling a daily series
+BUCKETS = [('D', 'Daily'), ('W', 'Weekly'), ('MS', 'Monthly'), ('QS', 'Quarterly'), ('YS', 'Yearly')]
+
+
+def lttb_indices(x, y, threshold):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    Always keeps the first and last point and, for each of the threshold-2
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the average of the next bucket. This keeps
+    the visual shape (peaks and troughs) of a line chart with a fixed
+    number of points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2)
+
+    kept = np.empty(threshold, dtype=int)
+    kept[0] = 0
+    kept[-1] = n - 1
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        average_x = x[end:next_end].mean()
+        average_y = y[end:next_end].mean()
+
+        # Twice the triangle area for each candidate in the current bucket
+        areas = np.abs(
+            (x[previous] - average_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (average_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        kept[bucket + 1] = previous
+
+    return kept
+
+
+def lttb(frame, x_column, y_column, threshold):
+    """Downsample a frame sorted by x_column to at most threshold rows"""
+    if len(frame) <= threshold:
+        return frame
+    x = frame[x_column]
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x = x.astype('int64')
+    indices = lttb_indices(x.to_numpy(), frame[y_column].to_numpy(), threshold)
+    return frame.iloc[indices].reset_index(drop=True)
+
+
+def resample_counts(dates, max_points):
+    """Count events per day, week, month... using the finest bucket that fits max_points.
+
+    Returns the bucketed frame (date, count) and the bucket label.
+    """
+    counts = pd.Series(1, index=pd.DatetimeIndex(dates)).sort_index()
+    if counts.empty:
+        return pd.DataFrame({'date': [], 'count': []}), 'Daily'
+
+    span_days = (counts.index[-1] - counts.index[0]).days + 1
+    approximate_days = {'D': 1, 'W': 7, 'MS': 30, 'QS': 91, 'YS': 365}
+    for rule, label in BUCKETS:
+        if span_days / approximate_days[rule] <= max_points or rule == 'YS':
+            break
+
+    if rule == 'D':
+        # Only days with activity, like the original daily chart
+        bucketed = counts.groupby(level=0).sum()
+    else:
+        bucketed = counts.resample(rule).sum()
+    frame = bucketed.reset_index()
+    frame.columns = ['date', 'count']
+    return frame, label
@@ -0,0 +1,116 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PooledHTTPClient:
+    """Process-wide HTTP client for DeepSeek calls.
+
+    One keep-alive connection pool is shared by every Streamlit session,
+    requests that hit 429/5xx or a connection error are retried with
+    jittered exponential backoff (honouring Retry-After), and a semaphore
+    caps the number of requests in flight across the whole process.
+    """
+
+    def __init__(self, max_in_flight=8, max_retries=4, backoff_base=0.5, backoff_cap=30.0, pool_size=None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+        pool_size = pool_size or max_in_flight
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def post(self, url, **kwargs):
+        """POST with retries, holding an in-flight slot during each attempt but not while backing off"""
+        response = self._send(url, **kwargs)
+        self._slots.release()
+        return response
+
+    @contextmanager
+    def stream_post(self, url, **kwargs):
+        """Streaming POST; the in-flight slot is held until the body has been consumed"""
+        response = self._send(url, stream=True, **kwargs)
+        try:
+            yield response
+        finally:
+            response.close()
+            self._slots.release()
+
+    def _send(self, url, **kwargs):
+        """Send with retries and return the final response still holding its in-flight slot.
+
+        The slot is released before every backoff sleep, so a failing
+        request does not keep other requests waiting while it sleeps.
+        """
+        attempt = 0
+        while True:
+            self._slots.acquire()
+            try:
+                response = self.session.post(url, **kwargs)
+            except BaseException as e:
+                self._slots.release()
+                if not isinstance(e, (requests.ConnectionError, requests.Timeout)) or attempt >= self.max_retries:
+                    raise
+                self._sleep(attempt)
+                attempt += 1
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                return response
+
+            retry_after = _retry_after_seconds(response.headers.get('Retry-After'))
+            response.close()
+            self._slots.release()
+            self._sleep(attempt, retry_after)
+            attempt += 1
+
+    def _sleep(self, attempt, retry_after=None):
+        if retry_after is not None:
+            delay = min(retry_after, self.backoff_cap)
+        else:
+            # Full jitter: uniform between zero and the exponential ceiling
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        time.sleep(delay)
+
+
+def _retry_after_seconds(value):
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Shared PooledHTTPClient, configured from DEEPSEEK_MAX_IN_FLIGHT and DEEPSEEK_MAX_RETRIES"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PooledHTTPClient(
+                max_in_flight=int(os.environ.get('DEEPSEEK_MAX_IN_FLIGHT', 8)),
+                max_retries=int(os.environ.get('DEEPSEEK_MAX_RETRIES', 4)),
+            )
+        return _client
@@ -0,0 +1,256 @@
+"""Timers, counters and optional profiling for the app's hot paths.
+
+Wrap work in span('name') or decorate it with @timed('name'); DeepSeek
+token usage is recorded with record_usage(). Everything lands in the
+process-wide MetricsRegistry and can be exported three ways:
+
+- METRICS_PORT=9100 serves Prometheus text format on /metrics
+- METRICS_JSONL=path appends one JSON line per finished span
+- render_prometheus() / snapshot() for anything else
+
+PROFILE=cprofile (or pyinstrument, if installed) profiles every
+outermost span and writes the result to PROFILE_DIR (default
+data/profiles). PROFILE_SPANS=name1,name2 restricts it to those spans.
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class MetricsRegistry:
+    """Process-wide counters and duration histograms."""
+
+    def __init__(self, jsonl_path=None):
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        # (name, labels) -> [bucket counts..., count, sum]
+        self._histograms = {}
+
+    def increment(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[(name, _label_key(labels))] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(DURATION_BUCKETS) + 2)
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+    def write_event(self, event):
+        """Append an event to the JSON-lines file, when one is configured"""
+        if not self.jsonl_path:
+            return
+        line = json.dumps(event, default=str) + '\n'
+        with self._lock:
+            with open(self.jsonl_path, 'a') as f:
+                f.write(line)
+
+    def snapshot(self):
+        """Current values as plain dicts, for tests, logs or a JSON endpoint"""
+        with self._lock:
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in self._counters.items()
+            ]
+            histograms = [
+                {'name': name, 'labels': dict(labels), 'count': histogram[-2], 'sum': histogram[-1]}
+                for (name, labels), histogram in self._histograms.items()
+            ]
+        return {'counters': counters, 'histograms': histograms}
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(value)) for key, value in self._histograms.items())
+
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram")
+                seen.add(name)
+            for bound, count in zip(DURATION_BUCKETS, histogram):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram[-2]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-1]}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def start_metrics_server(registry, port):
+    """Serve registry.render_prometheus() on /metrics from a background thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics():
+    """Process-wide MetricsRegistry, starting the /metrics server on first use if configured"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry(jsonl_path=os.environ.get('METRICS_JSONL'))
+            port = os.environ.get('METRICS_PORT')
+            if port:
+                try:
+                    start_metrics_server(_registry, int(port))
+                except OSError as e:
+                    # Another process (or an earlier server) already holds the port
+                    print(f"Error starting metrics server: {str(e)}")
+        return _registry
+
+
+# Nesting depth of spans on each thread; only outermost spans are profiled
+_local = threading.local()
+
+
+@contextmanager
+def _profiled(name):
+    mode = os.environ.get('PROFILE', '').lower()
+    only = {span_name.strip() for span_name in os.environ.get('PROFILE_SPANS', '').split(',') if span_name.strip()}
+    if not mode or getattr(_local, 'depth', 0) > 1 or (only and name not in only):
+        yield
+        return
+
+    directory = os.environ.get('PROFILE_DIR', os.path.join('data', 'profiles'))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{threading.get_ident()}")
+
+    if mode == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            yield
+            return
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path + '.html', 'w') as f:
+                f.write(profiler.output_html())
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path + '.prof')
+
+
+@contextmanager
+def span(name, **labels):
+    """Time a block of work and record it as app_span_duration_seconds{span=name}"""
+    registry = get_metrics()
+    _local.depth = getattr(_local, 'depth', 0) + 1
+    start = time.perf_counter()
+    failed = False
+    try:
+        with _profiled(name):
+            yield
+    except Exception:
+        failed = True
+        registry.increment('app_span_errors_total', span=name, **labels)
+        raise
+    finally:
+        _local.depth -= 1
+        seconds = time.perf_counter() - start
+        registry.observe('app_span_duration_seconds', seconds, span=name, **labels)
+        registry.write_event({
+            'ts': time.time(), 'span': name, 'seconds': round(seconds, 6), 'error': failed, **labels
+        })
+
+
+def timed(name):
+    """Decorator recording each call as a span; generators are timed until exhausted"""
+    def decorator(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                with span(name):
+                    yield from fn(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_usage(usage, operation):
+    """Count prompt and completion tokens from an API response's usage field"""
+    if not usage:
+        return
+    registry = get_metrics()
+    for kind in ('prompt', 'completion'):
+        tokens = usage.get(f'{kind}_tokens')
+        if tokens:
+            registry.increment('deepseek_tokens_total', tokens, operation=operation, kind=kind)
+    registry.increment('deepseek_requests_total', operation=operation)
+    registry.write_event({'ts': time.time(), 'usage': operation, **usage})
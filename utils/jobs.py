@@ -0,0 +1,139 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = {DONE, FAILED, CANCELLED}
+
+# Job running on the current worker thread, used by report_progress/check_cancelled
+_current_job = contextvars.ContextVar('current_job', default=None)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested"""
+
+
+def report_progress(done, total):
+    """Record progress of the job running on this thread, if any"""
+    job = _current_job.get()
+    if job is not None:
+        job.progress = (done, total)
+
+
+def check_cancelled():
+    """Stop the job running on this thread if it has been cancelled"""
+    job = _current_job.get()
+    if job is not None and job.cancel_requested.is_set():
+        raise JobCancelled("Job was cancelled")
+
+
+class Job:
+    """One unit of background work with its progress, result and cancellation flag."""
+
+    def __init__(self, description=''):
+        self.id = uuid.uuid4().hex
+        self.description = description
+        self.status = QUEUED
+        self.progress = (0, 0)
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.cancel_requested = threading.Event()
+        self.future = None
+
+    @property
+    def is_finished(self):
+        return self.status in FINISHED_STATES
+
+    def cancel(self):
+        """Ask the job to stop; a job that has not started yet is dropped right away"""
+        self.cancel_requested.set()
+        if self.future is not None and self.future.cancel():
+            self.status = CANCELLED
+            self.finished = time.time()
+
+    def _run(self, fn, args, kwargs):
+        if self.cancel_requested.is_set():
+            self.status = CANCELLED
+            self.finished = time.time()
+            return
+        token = _current_job.set(self)
+        self.status = RUNNING
+        try:
+            self.result = fn(*args, **kwargs)
+            self.status = DONE
+        except JobCancelled:
+            self.status = CANCELLED
+        except Exception as e:
+            print(f"Error in job {self.description or self.id}: {str(e)}")
+            self.error = str(e)
+            self.status = FAILED
+        finally:
+            self.finished = time.time()
+            _current_job.reset(token)
+
+
+class JobQueue:
+    """Worker pool for long-running work, with jobs looked up by id.
+
+    Jobs belong to the process rather than to a Streamlit script run, so
+    they keep running across reruns and page switches; a session only
+    keeps the job id. Finished jobs are kept for ttl seconds so their
+    result can still be collected.
+    """
+
+    def __init__(self, max_workers=4, ttl=3600):
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, description='', **kwargs):
+        job = Job(description)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(job._run, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def _prune(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.is_finished and now - job.finished > self.ttl]:
+            del self._jobs[job_id]
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Process-wide JobQueue shared by every page and session"""
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue(
+                max_workers=int(os.environ.get('JOB_WORKERS', 4)),
+                ttl=float(os.environ.get('JOB_TTL', 3600))
+            )
+        return _default_queue
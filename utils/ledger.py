@@ -0,0 +1,237 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from utils.positions import FIFO, PositionBook
+from utils.schema import CATEGORY_COLUMNS, LEDGER_COLUMNS, to_ledger_frame
+
+
+def frame_fingerprint(df):
+    """Content hash of a transactions frame, stable across sessions and restarts"""
+    hashed = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha256(hashed.tobytes()).hexdigest()
+
+
+class FingerprintSet:
+    """Set of hex identity fingerprints, kept as a sorted array of 16-byte digests.
+
+    A Python set of 64-character hex strings costs about 160 bytes per
+    transaction, more than the ledger frame itself; the first 16 bytes of
+    each SHA-256 digest cost 16 and are still far too long to collide.
+    Lookups are binary searches. Updates build a new array, so copies
+    can share the current one.
+    """
+
+    def __init__(self, fingerprints=()):
+        self._digests = np.unique(self._to_digests(fingerprints))
+
+    @staticmethod
+    def _to_digests(fingerprints):
+        # Fingerprints saved in full and as 32 hex digits match either way
+        packed = bytes.fromhex(''.join(fingerprint[:32] for fingerprint in fingerprints))
+        return np.frombuffer(packed, dtype='S16')
+
+    def __len__(self):
+        return len(self._digests)
+
+    def __iter__(self):
+        # tobytes() keeps trailing zero bytes, which indexing an 'S16' array would strip
+        packed = self._digests.tobytes()
+        return (packed[start:start + 16].hex() for start in range(0, len(packed), 16))
+
+    def __contains__(self, fingerprint):
+        return bool(self.contains([fingerprint])[0])
+
+    def contains(self, fingerprints):
+        """Boolean array telling which of the fingerprints are in the set"""
+        digests = self._to_digests(fingerprints)
+        positions = np.searchsorted(self._digests, digests)
+        found = positions < len(self._digests)
+        found[found] = self._digests[positions[found]] == digests[found]
+        return found
+
+    def update(self, fingerprints):
+        digests = self._to_digests(fingerprints)
+        if len(digests):
+            self._digests = np.union1d(self._digests, digests)
+
+    def copy(self):
+        copied = FingerprintSet()
+        copied._digests = self._digests
+        return copied
+
+    @property
+    def nbytes(self):
+        return self._digests.nbytes
+
+
+def _align_categories(*frames):
+    """Give the categorical columns of every frame the same categories, so concat keeps them categorical"""
+    aligned = list(frames)
+    for column in CATEGORY_COLUMNS:
+        categories = aligned[0][column].cat.categories
+        for frame in aligned[1:]:
+            categories = categories.union(frame[column].cat.categories)
+        aligned = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in aligned]
+    return aligned
+
+
+class Ledger:
+    """Transaction ledger that grows by appending only unseen transactions.
+
+    Keeps the fingerprints of every source block already ingested and
+    running totals for the portfolio metrics, so an append costs time
+    proportional to the new rows rather than the whole history.
+    """
+
+    def __init__(self, df=None, fingerprints=None):
+        self.df = to_ledger_frame(pd.DataFrame(columns=LEDGER_COLUMNS))
+        self.fingerprints = FingerprintSet()
+        self.version = hashlib.sha256(b'ledger').hexdigest()
+        self._buy_total = 0.0
+        self._sell_total = 0.0
+        self._securities = set()
+        # Position books by cost basis method, built on first use
+        self._books = {}
+        # (version, content hash) of the frame, see content_fingerprint
+        self._content_fingerprint = None
+
+        # Set by LedgerStore so appends are written through to disk
+        self.store = None
+        self.ledger_id = None
+        # Batches appended to a detached copy, persisted by LedgerStore.save_appended,
+        # and the version the copy was taken at
+        self.unsaved = None
+        self.base_version = None
+
+        if df is not None:
+            self.append(df, fingerprints or [])
+
+    def __len__(self):
+        return len(self.df)
+
+    def append(self, new_df, fingerprints):
+        """Merge newly converted rows and update the running aggregates"""
+        new_df = to_ledger_frame(new_df.reindex(columns=LEDGER_COLUMNS))
+
+        self._buy_total += new_df.loc[new_df['transaction_type'] == 'BUY', 'amount'].sum()
+        self._sell_total += new_df.loc[new_df['transaction_type'] == 'SELL', 'amount'].sum()
+        self._securities.update(new_df['security'].dropna().unique())
+        self.fingerprints.update(fingerprints)
+
+        # Chain the version so it changes with every batch of new fingerprints
+        digest = hashlib.sha256(self.version.encode())
+        for fingerprint in sorted(fingerprints):
+            digest.update(fingerprint.encode())
+        self.version = digest.hexdigest()
+
+        if self.store is not None:
+            self.store.append(self.ledger_id, new_df, fingerprints, self.version)
+        elif self.unsaved is not None:
+            self.unsaved.append((new_df, list(fingerprints)))
+
+        self._update_books(new_df)
+
+        if self.df.empty:
+            self.df = new_df.reset_index(drop=True)
+        elif not new_df.empty:
+            new_df, current = _align_categories(new_df, self.df)
+            self.df = (
+                pd.concat([new_df, current], ignore_index=True)
+                .sort_values('date', ascending=False, kind='stable')
+                .reset_index(drop=True)
+            )
+
+    def copy(self):
+        """Copy to append to off the session's thread, detached from the store.
+
+        Appends to the copy are kept in unsaved rather than written through,
+        so a job that fails or is cancelled part-way persists nothing; the
+        job saves them all at once with LedgerStore.save_appended. Frames
+        are replaced rather than modified on append, so the copy can share
+        the current one until its first append.
+        """
+        ledger = Ledger()
+        ledger.df = self.df
+        ledger.fingerprints = self.fingerprints.copy()
+        ledger.version = self.version
+        ledger._buy_total = self._buy_total
+        ledger._sell_total = self._sell_total
+        ledger._securities = set(self._securities)
+        ledger.unsaved = []
+        ledger.base_version = self.version
+        return ledger
+
+    @property
+    def content_fingerprint(self):
+        """Content hash of the ledger frame, computed once per version.
+
+        The version only chains the identity fingerprints, which are the
+        same for a paste and a CSV export of the same trades even though
+        only the export has quantities, accounts and fees. Caches shared
+        between sessions are keyed on this instead.
+        """
+        cached = self._content_fingerprint
+        if cached is None or cached[0] != self.version:
+            cached = self._content_fingerprint = (self.version, frame_fingerprint(self.df))
+        return cached[1]
+
+    def memory_usage(self, deep=True):
+        """Approximate bytes held: the frame plus the fingerprint digests"""
+        return int(self.df.memory_usage(deep=deep).sum()) + self.fingerprints.nbytes
+
+    def __getstate__(self):
+        # Position books are rebuilt on first use, and the store holds a lock
+        state = self.__dict__.copy()
+        state['_books'] = {}
+        state['store'] = None
+        return state
+
+    def __setstate__(self, state):
+        # Ledgers pickled before these attributes existed
+        self.__dict__.update({'unsaved': None, 'base_version': None, '_content_fingerprint': None})
+        self.__dict__.update(state)
+        if isinstance(self.fingerprints, set):
+            # Pickled when fingerprints were a set of hex strings
+            self.fingerprints = FingerprintSet(self.fingerprints)
+        if self.ledger_id is not None:
+            # Ledgers are only bound to a store by the default LedgerStore in the app
+            from utils.ledger_store import get_ledger_store
+            self.store = get_ledger_store()
+
+    def _update_books(self, new_df):
+        """Apply new trades to the position books, or drop books they would reorder"""
+        if new_df.empty:
+            return
+        oldest = str(new_df['date'].min())[:10]
+        for method, book in list(self._books.items()):
+            if book.last_date is not None and oldest < book.last_date:
+                # Back-filled history changes the lot order; rebuild on next use
+                del self._books[method]
+            else:
+                book.apply_frame(new_df)
+
+    def positions(self, method=FIFO):
+        """PositionBook for this ledger, kept up to date as trades are appended"""
+        book = self._books.get(method)
+        if book is None:
+            book = PositionBook(method)
+            book.apply_frame(self.df)
+            self._books[method] = book
+        return book
+
+    @property
+    def metrics(self):
+        """Same metrics as WealthSimpleParser.calculate_portfolio_metrics, kept up to date incrementally"""
+        return {
+            'total_invested': abs(self._buy_total),
+            'total_sold': abs(self._sell_total),
+            'num_transactions': len(self.df),
+            'unique_securities': len(self._securities),
+        }
+
+    def to_csv(self):
+        """CSV text of the ledger, generated on demand rather than kept around"""
+        df = self.df.assign(date=self.df['date'].dt.strftime('%Y-%m-%d'))
+        return df.to_csv(index=False).strip()
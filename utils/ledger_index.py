@@ -0,0 +1,225 @@
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import (
+    MAX_CHART_POINTS, AnalyticsSnapshot, allocation_series, compute_metrics, cumulative_pl_series,
+    daily_counts_frame, prepare_frame, recent_transactions_frame,
+)
+from utils.downsample import lttb
+from utils.instrumentation import timed
+from utils.positions import FIFO, PositionBook, has_quantities, realized_pnl
+from utils.valuation import daily_valuation
+
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+class LedgerFilter(NamedTuple):
+    """Dashboard filter: an inclusive date range and the tickers and accounts to keep (empty keeps all)."""
+    start: object = None
+    end: object = None
+    tickers: tuple = ()
+    accounts: tuple = ()
+
+    @property
+    def active(self):
+        return self.start is not None or self.end is not None or bool(self.tickers) or bool(self.accounts)
+
+
+def filter_options(transactions_df):
+    """Date bounds, tickers and accounts to offer as filters, without building an index"""
+    dates = pd.to_datetime(transactions_df['date'])
+    tickers = _values(transactions_df['security'])
+    accounts = _values(transactions_df['account']) if 'account' in transactions_df.columns else []
+    # Tuples, since the options are shared by every session on the ledger
+    return dates.min(), dates.max(), tuple(tickers), tuple(account for account in accounts if account)
+
+
+_filter_options = OrderedDict()
+_filter_options_lock = threading.Lock()
+MAX_FILTER_OPTIONS = 64
+
+
+def get_filter_options(transactions_df, ledger_fingerprint):
+    """filter_options for a ledger's content (Ledger.content_fingerprint), computed once and shared by every rerun"""
+    with _filter_options_lock:
+        options = _filter_options.get(ledger_fingerprint)
+        if options is not None:
+            _filter_options.move_to_end(ledger_fingerprint)
+            return options
+
+    options = filter_options(transactions_df)
+
+    with _filter_options_lock:
+        _filter_options[ledger_fingerprint] = options
+        while len(_filter_options) > MAX_FILTER_OPTIONS:
+            _filter_options.popitem(last=False)
+    return options
+
+
+def _values(column):
+    # A ledger's categoricals only hold values that occur in it
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return sorted(str(value) for value in column.cat.categories)
+    return sorted(str(value) for value in column.dropna().unique())
+
+
+class LedgerIndex:
+    """Indexes over one ledger version for filtering the dashboard without rescanning it.
+
+    The frame is kept sorted by date, so a date range is two binary
+    searches and a slice. A second ordering by (security, date) gives
+    every ticker a contiguous row range, searched the same way, and
+    account codes are a small integer array. Realized P&L and each
+    trade's change in open units and cost come from one replay of the
+    full history, so a filtered slice still matches sells against buys
+    made before the range. Every filtered snapshot is then computed
+    from the selected rows only.
+    """
+
+    def __init__(self, transactions_df, method=FIFO, max_cached=8):
+        df = prepare_frame(transactions_df).reset_index(drop=True)
+        self.df = df
+        self.method = method
+        self.dates = df['date'].to_numpy(dtype='datetime64[ns]')
+
+        codes, tickers = pd.factorize(df['security'].astype(str), sort=True)
+        # df is in date order, so sorting positions by ticker keeps each ticker's rows in date order
+        self.ticker_order = np.argsort(codes, kind='stable')
+        starts = np.searchsorted(codes[self.ticker_order], np.arange(len(tickers) + 1))
+        self.ticker_ranges = {ticker: (starts[i], starts[i + 1]) for i, ticker in enumerate(tickers)}
+        self.ticker_dates = self.dates[self.ticker_order]
+
+        accounts = df['account'].astype(str) if 'account' in df.columns else pd.Series('', index=df.index)
+        self.account_codes, self.accounts = pd.factorize(accounts)
+
+        if has_quantities(df):
+            realized, units, cost = PositionBook(method).apply_frame_with_changes(df)
+            self.changes = (units, cost)
+        else:
+            realized = realized_pnl(df).trades['realized_pl'].to_numpy(dtype=float)
+            self.changes = None
+        self.realized = realized
+
+        self.max_cached = max_cached
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.df)
+
+    def rows(self, ledger_filter):
+        """Positions of the rows matching the filter, in date order"""
+        start = np.datetime64(pd.Timestamp(ledger_filter.start), 'ns') if ledger_filter.start is not None else None
+        # The end date is inclusive
+        end = np.datetime64(pd.Timestamp(ledger_filter.end), 'ns') + ONE_DAY if ledger_filter.end is not None else None
+
+        if ledger_filter.tickers:
+            parts = []
+            for ticker in ledger_filter.tickers:
+                if ticker not in self.ticker_ranges:
+                    continue
+                first, last = self.ticker_ranges[ticker]
+                dates = self.ticker_dates[first:last]
+                lo = np.searchsorted(dates, start, 'left') if start is not None else 0
+                hi = np.searchsorted(dates, end, 'left') if end is not None else len(dates)
+                parts.append(self.ticker_order[first + lo:first + hi])
+            rows = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+        else:
+            lo = np.searchsorted(self.dates, start, 'left') if start is not None else 0
+            hi = np.searchsorted(self.dates, end, 'left') if end is not None else len(self.dates)
+            rows = np.arange(lo, hi)
+
+        if ledger_filter.accounts:
+            wanted = self.accounts.get_indexer(list(ledger_filter.accounts))
+            rows = rows[np.isin(self.account_codes[rows], wanted[wanted >= 0])]
+        return rows
+
+    def snapshot(self, ledger_filter, prices=None):
+        """AnalyticsSnapshot of the filtered rows, cached per filter and price cache version"""
+        key = (ledger_filter, prices.version() if prices is not None else None)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                self._snapshots.move_to_end(key)
+                return snapshot
+
+        snapshot = self._build_snapshot(ledger_filter, prices)
+
+        with self._lock:
+            self._snapshots[key] = snapshot
+            while len(self._snapshots) > self.max_cached:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    @timed('ledger_index.build_snapshot')
+    def _build_snapshot(self, ledger_filter, prices):
+        rows = self.rows(ledger_filter)
+        df = self.df.take(rows)
+        realized = self.realized[rows]
+        daily_counts, volume_bucket = daily_counts_frame(df)
+
+        return AnalyticsSnapshot(
+            metrics=compute_metrics(df),
+            cumulative_pl=cumulative_pl_series(df),
+            allocation=allocation_series(df),
+            daily_counts=daily_counts,
+            volume_bucket=volume_bucket,
+            security_pl=(
+                pd.Series(np.nan_to_num(realized), index=pd.Index(df['security'].astype(str), name='security'))
+                .groupby(level=0, sort=False).sum()
+            ),
+            trade_pl=df.assign(realized_pl=realized),
+            recent_transactions=recent_transactions_frame(df),
+            valuation=self._valuation(ledger_filter, prices) if prices is not None else None,
+        )
+
+    def _valuation(self, ledger_filter, prices):
+        """Valuation of the selected tickers and accounts over the date range"""
+        if self.changes is None:
+            return None
+
+        # Holdings on the first day of the range depend on every earlier trade
+        rows = self.rows(ledger_filter._replace(start=None))
+        if len(rows) == 0:
+            return None
+        units, cost = self.changes
+        valuation = daily_valuation(
+            self.df.take(rows), prices, self.method,
+            end=pd.Timestamp(ledger_filter.end) if ledger_filter.end is not None else None,
+            changes=(units[rows], cost[rows]),
+        )
+        if valuation is None:
+            return None
+
+        daily = valuation.daily
+        if ledger_filter.start is not None:
+            daily = daily[daily['date'] >= pd.Timestamp(ledger_filter.start)]
+        if daily.empty:
+            return None
+        return valuation._replace(daily=lttb(daily.reset_index(drop=True), 'date', 'market_value', MAX_CHART_POINTS))
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+MAX_INDEXES = 4
+
+
+def get_ledger_index(transactions_df, ledger_fingerprint):
+    """LedgerIndex for a ledger's content (Ledger.content_fingerprint), built on first use and shared by every session"""
+    with _indexes_lock:
+        index = _indexes.get(ledger_fingerprint)
+        if index is not None:
+            _indexes.move_to_end(ledger_fingerprint)
+            return index
+
+    index = LedgerIndex(transactions_df)
+
+    with _indexes_lock:
+        _indexes[ledger_fingerprint] = index
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,187 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from utils.schema import LEDGER_COLUMNS, LOT_COLUMNS, to_ledger_frame
+
+
+def _optional_float(value):
+    # None and NaN (the only value not equal to itself) are stored as NULL
+    return None if value is None or value != value else float(value)
+
+
+class LedgerChangedError(Exception):
+    """Raised when a saved ledger changed after the copy being saved was taken from it."""
+
+
+class LedgerStore:
+    """SQLite-backed persistent storage for transaction ledgers.
+
+    Transactions are indexed by (ledger, date), which serves loading a
+    ledger in date order and deleting it without scanning other ledgers.
+
+    pandas and the Ledger class are imported on first load, so pages that
+    find no saved ledger never pay for them.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.environ.get('LEDGER_DB_PATH', os.path.join('data', 'ledger.sqlite3'))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS ledgers (
+                    ledger_id TEXT PRIMARY KEY,
+                    version TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS transactions (
+                    ledger_id TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    security TEXT,
+                    transaction_type TEXT,
+                    amount REAL,
+                    account TEXT,
+                    details TEXT,
+                    quantity REAL,
+                    fees REAL
+                );
+                CREATE INDEX IF NOT EXISTS transactions_by_date
+                    ON transactions (ledger_id, date);
+                -- No read path filters by security; drop the index older databases have
+                DROP INDEX IF EXISTS transactions_by_security;
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    ledger_id TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    PRIMARY KEY (ledger_id, fingerprint)
+                ) WITHOUT ROWID;
+            """)
+            # Databases created before lot details were stored
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(transactions)")}
+            for column, sql_type in zip(LOT_COLUMNS, ['TEXT', 'TEXT', 'REAL', 'REAL']):
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE transactions ADD COLUMN {column} {sql_type}")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save_ledger(self, ledger_id, ledger):
+        """Store a whole ledger under this id, replacing anything stored there before in one transaction"""
+        with self._lock, self._connect() as conn:
+            self._delete(conn, ledger_id)
+            self._insert(conn, ledger_id, ledger.df, ledger.fingerprints, ledger.version)
+        ledger.store, ledger.ledger_id = self, ledger_id
+
+    def save_appended(self, ledger_id, ledger):
+        """Persist what was appended to a detached Ledger.copy in one transaction, then bind the copy here.
+
+        Raises LedgerChangedError, writing nothing, when the saved ledger is
+        no longer at the version the copy was taken at: another tab saved to
+        it meanwhile, and writing would store overlapping trades twice.
+        """
+        with self._lock, self._connect() as conn:
+            # Take the write lock before reading, so no other process can save in between
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT version FROM ledgers WHERE ledger_id = ?", (ledger_id,)).fetchone()
+            if row is None or row[0] != ledger.base_version:
+                raise LedgerChangedError(f"Ledger {ledger_id} changed while it was being updated")
+            for new_df, fingerprints in ledger.unsaved:
+                self._insert(conn, ledger_id, new_df, fingerprints, ledger.version)
+        ledger.unsaved = None
+        ledger.store, ledger.ledger_id = self, ledger_id
+
+    def ledger_version(self, ledger_id):
+        """Version of the saved ledger, or None when nothing has been saved under this id"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT version FROM ledgers WHERE ledger_id = ?", (ledger_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def load_ledger(self, ledger_id):
+        """Load a full ledger, bound to this store so appends are persisted"""
+        from utils.ledger import Ledger
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT version FROM ledgers WHERE ledger_id = ?", (ledger_id,)
+            ).fetchone()
+            fingerprints = [
+                fingerprint for (fingerprint,) in conn.execute(
+                    "SELECT fingerprint FROM fingerprints WHERE ledger_id = ?", (ledger_id,)
+                )
+            ]
+
+        ledger = Ledger(self.load_frame(ledger_id), fingerprints)
+        if row is not None:
+            ledger.version = row[0]
+        ledger.store, ledger.ledger_id = self, ledger_id
+        return ledger
+
+    def load_frame(self, ledger_id):
+        """Load the transactions of a ledger, newest first"""
+        import pandas as pd
+
+        query = (
+            f"SELECT {', '.join(LEDGER_COLUMNS)} FROM transactions "
+            "WHERE ledger_id = ? ORDER BY date DESC, rowid"
+        )
+        with self._connect() as conn:
+            df = pd.read_sql_query(query, conn, params=[ledger_id])
+        return to_ledger_frame(df)
+
+    def append(self, ledger_id, new_df, fingerprints, version):
+        """Persist newly appended rows and fingerprints"""
+        with self._lock, self._connect() as conn:
+            self._insert(conn, ledger_id, new_df, fingerprints, version)
+
+    def delete(self, ledger_id):
+        with self._lock, self._connect() as conn:
+            self._delete(conn, ledger_id)
+
+    def _insert(self, conn, ledger_id, new_df, fingerprints, version):
+        rows = [
+            (ledger_id, str(row.date)[:10], row.security, row.transaction_type, float(row.amount),
+             row.account, row.details, _optional_float(row.quantity),
+             float(row.fees))
+            for row in new_df.reindex(columns=LEDGER_COLUMNS).itertuples(index=False)
+        ]
+        conn.executemany(
+            f"INSERT INTO transactions (ledger_id, {', '.join(LEDGER_COLUMNS)}) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO fingerprints (ledger_id, fingerprint) VALUES (?, ?)",
+            [(ledger_id, fingerprint) for fingerprint in fingerprints]
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO ledgers (ledger_id, version) VALUES (?, ?)",
+            (ledger_id, version)
+        )
+
+    def _delete(self, conn, ledger_id):
+        for table in ('transactions', 'fingerprints', 'ledgers'):
+            conn.execute(f"DELETE FROM {table} WHERE ledger_id = ?", (ledger_id,))
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_ledger_store():
+    """Process-wide LedgerStore shared by every page and session"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = LedgerStore()
+        return _default_store
@@ -0,0 +1,208 @@
+import re
+import hashlib
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+
+# Line shapes found in the Wealthsimple activity paste
+DATE_RE = re.compile(
+    r'^(January|February|March|April|May|June|July|August|September|October|November|December)'
+    r' \d{1,2}, \d{4}$'
+)
+ORDER_TYPE_RE = re.compile(
+    r'^(?:(?:limit|market|fractional|stop limit|stop|recurring)\s+)?(buy|sell)$',
+    re.IGNORECASE
+)
+AMOUNT_RE = re.compile(r'^(-)?\$([\d,]+(?:\.\d+)?)(?:\s+([A-Z]{3}))?$')
+STATUS_RE = re.compile(
+    r'^(completed|filled|cancelled|canceled|expired|rejected|pending|failed)$',
+    re.IGNORECASE
+)
+TICKER_RE = re.compile(r'^[A-Z][A-Z0-9.\-]{0,9}$')
+
+# Statuses that mean the order actually executed
+FILLED_STATUSES = {'completed', 'filled'}
+
+# Parser states
+IDLE = 'idle'
+HEADER = 'header'
+ACCOUNT = 'account'
+AMOUNT = 'amount'
+DONE = 'done'
+
+
+@dataclass
+class TransactionBlock:
+    """One transaction entry from the paste, recognized or not."""
+    date: str = None
+    date_line: str = None
+    lines: list = field(default_factory=list)
+    header: list = field(default_factory=list)
+    order_type: str = None
+    account: str = None
+    amount: float = None
+    currency: str = None
+    status: str = None
+    broken: bool = False
+
+    @property
+    def security(self):
+        if not self.header:
+            return None
+        ticker = self.header[-1].split(' ', 1)[0]
+        return ticker if TICKER_RE.match(ticker) else None
+
+    @property
+    def details(self):
+        if not self.header:
+            return ''
+        parts = self.header[-1].split(' ', 1)
+        return parts[1] if len(parts) > 1 else ''
+
+    @property
+    def transaction_type(self):
+        match = ORDER_TYPE_RE.match(self.order_type or '')
+        return match.group(1).upper() if match else None
+
+    @property
+    def recognized(self):
+        return (
+            not self.broken
+            and self.date is not None
+            and self.security is not None
+            and self.transaction_type is not None
+            and self.account is not None
+            and self.amount is not None
+        )
+
+    @property
+    def executed(self):
+        return self.status is None or self.status.lower() in FILLED_STATUSES
+
+    @property
+    def identity(self):
+        """Fields that identify the transaction, or the normalized text if unrecognized."""
+        if not self.recognized:
+            return self.normalized
+        return '|'.join([
+            self.date, self.security, self.details, self.order_type.lower(),
+            self.account, f"{self.amount:.2f}", self.currency or '',
+            '' if self.executed else self.status.lower()
+        ])
+
+    @property
+    def normalized(self):
+        """Whitespace-insensitive form of the block, used for hashing."""
+        lines = [' '.join(line.split()) for line in self.lines]
+        return '\n'.join([self.date or ''] + lines)
+
+    @property
+    def text(self):
+        """Raw text of the block, prefixed with its date heading."""
+        lines = [self.date_line] if self.date_line else []
+        return '\n'.join(lines + self.lines)
+
+
+def iter_blocks(lines):
+    """Stream TransactionBlocks out of an iterable of paste lines.
+
+    Every entry in the paste is a few non-empty lines: one or two
+    ticker/details lines, the order type, the account and the amount,
+    optionally followed by a status line. Date headings apply to all
+    entries below them until the next heading.
+    """
+    state = IDLE
+    date, date_line = None, None
+    block = None
+
+    for raw_line in lines:
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        if DATE_RE.match(line):
+            if block is not None:
+                if state != DONE:
+                    block.broken = True
+                yield block
+                block = None
+            date = datetime.strptime(line, '%B %d, %Y').strftime('%Y-%m-%d')
+            date_line = line
+            state = IDLE
+            continue
+
+        if state == DONE:
+            if STATUS_RE.match(line):
+                block.lines.append(line)
+                block.status = line
+                yield block
+                block = None
+                state = IDLE
+                continue
+            yield block
+            block = None
+            state = IDLE
+
+        if state == IDLE:
+            block = TransactionBlock(date=date, date_line=date_line)
+            state = HEADER
+
+        block.lines.append(line)
+        amount_match = AMOUNT_RE.match(line)
+
+        if block.broken:
+            # Skip ahead to the amount line that closes this entry
+            if amount_match:
+                state = DONE
+        elif state == HEADER:
+            if ORDER_TYPE_RE.match(line):
+                block.order_type = line
+                state = ACCOUNT
+            elif amount_match:
+                block.broken = True
+                state = DONE
+            elif len(block.header) < 2:
+                block.header.append(line)
+            else:
+                block.broken = True
+        elif state == ACCOUNT:
+            if amount_match:
+                block.broken = True
+                state = DONE
+            else:
+                block.account = line
+                state = AMOUNT
+        elif state == AMOUNT:
+            if amount_match:
+                _, value, currency = amount_match.groups()
+                block.amount = float(value.replace(',', ''))
+                block.currency = currency
+                state = DONE
+            else:
+                block.broken = True
+
+    if block is not None:
+        if state != DONE:
+            block.broken = True
+        yield block
+
+
+def fingerprint_identities(identities, seen=None):
+    """Fingerprint each identity string by its value and how many times it was seen before.
+
+    Two identical fills on the same day are separate transactions, so the
+    n-th repeat of an identity gets its own fingerprint. Re-importing an
+    overlapping history reproduces the same fingerprints. Pass the same
+    seen Counter when fingerprinting a long history in pieces.
+    """
+    seen = Counter() if seen is None else seen
+    fingerprints = []
+    for identity in identities:
+        fingerprints.append(hashlib.sha256(f"{identity}#{seen[identity]}".encode()).hexdigest())
+        seen[identity] += 1
+    return fingerprints
+
+
+def fingerprint_blocks(blocks):
+    """Fingerprints for paste blocks, see fingerprint_identities"""
+    return fingerprint_identities(block.identity for block in blocks)
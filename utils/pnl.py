@@ -0,0 +1,78 @@
+from collections import deque
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+class RealizedPnL(NamedTuple):
+    """Realized profit/loss per security and per trade."""
+    by_security: pd.Series
+    trades: pd.DataFrame
+
+
+def calculate_realized_pnl(df):
+    """Match sells against earlier buys FIFO and return realized profit/loss.
+
+    Lots are matched on dollar amounts: a sell consumes the oldest open buy
+    lots until its amount is used up, and a partially consumed lot stays at
+    the front of the queue. The frame is sorted once by security and date
+    and each security is then walked in a single pass over numpy arrays, so
+    the cost is O(n log n) for the sort plus O(n) for the matching.
+    """
+    n = len(df)
+    if n == 0:
+        return RealizedPnL(
+            by_security=pd.Series(dtype=float),
+            trades=df.assign(realized_pl=pd.Series(dtype=float))
+        )
+
+    codes, securities = pd.factorize(df['security'])
+    dates = pd.to_datetime(df['date']).to_numpy()
+    amounts = np.abs(df['amount'].to_numpy(dtype=float))
+    types = df['transaction_type'].to_numpy()
+    is_buy = types == 'BUY'
+    is_sell = types == 'SELL'
+
+    # One stable sort groups each security's trades in date order
+    order = np.lexsort((dates, codes))
+    sorted_codes = codes[order]
+    group_starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    group_ends = np.r_[group_starts[1:], n]
+
+    realized = np.zeros(n)
+    totals = np.zeros(len(securities))
+
+    for start, end in zip(group_starts, group_ends):
+        buy_queue = deque()
+        total_profit = 0.0
+
+        for position in order[start:end]:
+            if is_buy[position]:
+                buy_queue.append(amounts[position])
+            elif is_sell[position]:
+                sell_amount = amounts[position]
+                trade_profit = 0.0
+
+                while sell_amount > 0 and buy_queue:
+                    buy_amount = buy_queue.popleft()
+
+                    if buy_amount <= sell_amount:
+                        # Complete sell of this buy lot
+                        trade_profit += sell_amount - buy_amount
+                        sell_amount -= buy_amount
+                    else:
+                        # Partial sell, the remainder stays at the front of the queue
+                        buy_queue.appendleft(buy_amount - sell_amount)
+                        sell_amount = 0
+
+                realized[position] = trade_profit
+                total_profit += trade_profit
+
+        if codes[order[start]] >= 0:
+            totals[codes[order[start]]] = total_profit
+
+    by_security = pd.Series(totals, index=pd.Index(securities, name='security'))
+    trades = df.assign(realized_pl=realized)
+
+    return RealizedPnL(by_security=by_security, trades=trades)
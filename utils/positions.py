@@ -0,0 +1,286 @@
+import re
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from utils.pnl import RealizedPnL, calculate_realized_pnl
+from utils.schema import day_strings
+
+# Cost basis methods
+FIFO = 'fifo'
+ACB = 'acb'
+
+# Shares controlled by one listed option contract
+OPTION_MULTIPLIER = 100
+OPTION_RE = re.compile(r'\b(call|put)s?\b', re.IGNORECASE)
+
+# Remaining quantities below this are rounding noise from fractional shares
+EPSILON = 1e-9
+
+
+def contract_multiplier(details):
+    """Units per traded quantity: 100 for option contracts, 1 for shares"""
+    return OPTION_MULTIPLIER if details and OPTION_RE.search(details) else 1
+
+
+class LotQueue:
+    """Open lots of one position, oldest first, in compact parallel arrays.
+
+    New lots are appended at the tail and sells consume from the head, so
+    both are O(1) amortized. Consumed lots are dropped in bulk once they
+    make up more than half of the arrays.
+    """
+
+    def __init__(self):
+        self.quantity = array('d')
+        self.cost = array('d')
+        self.fees = array('d')
+        self.head = 0
+
+    def __len__(self):
+        return len(self.quantity) - self.head
+
+    def push(self, quantity, cost, fees):
+        self.quantity.append(quantity)
+        self.cost.append(cost)
+        self.fees.append(fees)
+
+    def consume(self, quantity):
+        """Remove up to quantity from the oldest lots.
+
+        Returns the quantity actually matched and the cost and fees of the
+        lots (or parts of lots) it came from.
+        """
+        matched = cost = fees = 0.0
+        while quantity > EPSILON and self.head < len(self.quantity):
+            lot_quantity = self.quantity[self.head]
+            if lot_quantity <= quantity + EPSILON:
+                # Whole lot sold
+                matched += lot_quantity
+                cost += self.cost[self.head]
+                fees += self.fees[self.head]
+                quantity -= lot_quantity
+                self.head += 1
+            else:
+                # Part of the lot sold, the rest stays at the head
+                share = quantity / lot_quantity
+                lot_cost = self.cost[self.head] * share
+                lot_fees = self.fees[self.head] * share
+                matched += quantity
+                cost += lot_cost
+                fees += lot_fees
+                self.quantity[self.head] = lot_quantity - quantity
+                self.cost[self.head] -= lot_cost
+                self.fees[self.head] -= lot_fees
+                quantity = 0.0
+
+        if self.head > len(self.quantity) // 2:
+            del self.quantity[:self.head]
+            del self.cost[:self.head]
+            del self.fees[:self.head]
+            self.head = 0
+
+        return matched, cost, fees
+
+
+class Position:
+    """Open quantity and cost basis of one security or option series in one account.
+
+    With FIFO each buy is kept as a lot and sells consume the oldest lots.
+    With ACB (adjusted cost base, the average cost method used for Canadian
+    tax reporting) only the pooled quantity and cost are kept and a sell
+    removes its share of the pooled cost.
+
+    Buy amounts are the all-in CAD cost, fees included; sell amounts are
+    the net CAD proceeds. Fees are carried separately for reporting.
+    """
+
+    def __init__(self, method=FIFO, multiplier=1):
+        self.method = method
+        self.multiplier = multiplier
+        self.lots = LotQueue() if method == FIFO else None
+        self.quantity = 0.0
+        self.cost = 0.0
+        self.fees = 0.0
+        self.realized = 0.0
+        # Quantity sold that was never bought within the known history
+        self.unmatched_quantity = 0.0
+
+    def buy(self, quantity, amount, fees=0.0):
+        if self.lots is not None:
+            self.lots.push(quantity, amount, fees)
+        self.quantity += quantity
+        self.cost += amount
+        self.fees += fees
+
+    def sell(self, quantity, amount):
+        """Close quantity of the position and return the realized gain"""
+        if self.lots is not None:
+            matched, cost, fees = self.lots.consume(quantity)
+        else:
+            matched = min(quantity, self.quantity)
+            share = matched / self.quantity if self.quantity > EPSILON else 0.0
+            cost = self.cost * share
+            fees = self.fees * share
+
+        # Proceeds of unmatched quantity have no known cost, so they are left out
+        proceeds = amount * matched / quantity if quantity > 0 else 0.0
+        gain = proceeds - cost
+
+        self.unmatched_quantity += quantity - matched
+        self.quantity -= matched
+        self.cost -= cost
+        self.fees -= fees
+        if self.quantity <= EPSILON:
+            self.quantity = self.cost = self.fees = 0.0
+        self.realized += gain
+        return gain
+
+    @property
+    def average_cost(self):
+        """Cost per underlying share (per contract / multiplier for options)"""
+        units = self.quantity * self.multiplier
+        return self.cost / units if units > EPSILON else 0.0
+
+
+class PositionBook:
+    """Quantity-aware positions for a whole ledger, updated one trade at a time.
+
+    Trades must be applied in date order; each one costs O(1) amortized,
+    so appending new trades never replays the history. Trades without a
+    known quantity (the activity paste does not include one) are counted
+    in untracked and otherwise ignored.
+    """
+
+    def __init__(self, method=FIFO):
+        if method not in (FIFO, ACB):
+            raise ValueError(f"Unknown cost basis method: {method}")
+        self.method = method
+        self.positions = {}
+        self.untracked = 0
+        self.last_date = None
+
+    def apply(self, date, security, transaction_type, amount, quantity, account='', details='', fees=0.0):
+        """Apply one trade and return its realized gain (0.0 for buys, NaN if untracked)"""
+        self.last_date = str(date)[:10]
+        if not quantity > 0:
+            self.untracked += 1
+            return np.nan
+
+        key = (account or '', security, details or '')
+        position = self.positions.get(key)
+        if position is None:
+            position = Position(self.method, contract_multiplier(details))
+            self.positions[key] = position
+
+        amount = abs(amount)
+        if transaction_type == 'BUY':
+            position.buy(quantity, amount, fees if fees == fees else 0.0)
+            return 0.0
+        if transaction_type == 'SELL':
+            return position.sell(quantity, amount)
+        return np.nan
+
+    def apply_frame(self, df):
+        """Apply every trade of a ledger frame, oldest first.
+
+        Returns the realized gain of each row, aligned with the frame.
+        """
+        realized, _, _ = self._apply_rows(df, track_changes=False)
+        return realized
+
+    def apply_frame_with_changes(self, df):
+        """Like apply_frame, also returning each row's change in open units and open cost.
+
+        Units are quantity times the contract multiplier, so option
+        contracts count as the shares they control.
+        """
+        return self._apply_rows(df, track_changes=True)
+
+    def _apply_rows(self, df, track_changes):
+        n = len(df)
+        realized = np.full(n, np.nan)
+        units = np.zeros(n) if track_changes else None
+        cost = np.zeros(n) if track_changes else None
+        if n == 0:
+            return realized, units, cost
+
+        # Ledger frames are newest first, including within a day
+        dates = day_strings(df['date'])
+        order = np.argsort(dates[::-1], kind='stable')
+        order = n - 1 - order
+
+        columns = [
+            dates, df['security'].to_numpy(), df['transaction_type'].to_numpy(),
+            df['amount'].to_numpy(dtype=float), _column(df, 'quantity', np.nan, float),
+            _column(df, 'account', ''), _column(df, 'details', ''), _column(df, 'fees', 0.0, float),
+        ]
+        # Plain Python values in replay order are much cheaper to index than numpy scalars
+        trades = zip(*(column[order].tolist() for column in columns))
+
+        if not track_changes:
+            realized[order] = [self.apply(*trade) for trade in trades]
+            return realized, units, cost
+
+        gains, unit_changes, cost_changes = [], [], []
+        for trade in trades:
+            key = (trade[5] or '', trade[1], trade[6] or '')
+            before = self.positions.get(key)
+            quantity_before, cost_before = (before.quantity, before.cost) if before else (0.0, 0.0)
+            gains.append(self.apply(*trade))
+            after = self.positions.get(key)
+            if after is None:
+                unit_changes.append(0.0)
+                cost_changes.append(0.0)
+            else:
+                unit_changes.append((after.quantity - quantity_before) * after.multiplier)
+                cost_changes.append(after.cost - cost_before)
+        realized[order] = gains
+        units[order] = unit_changes
+        cost[order] = cost_changes
+        return realized, units, cost
+
+    def holdings(self):
+        """One row per position with its open quantity, cost basis and realized gain"""
+        rows = [
+            (account, security, details, position.quantity, position.multiplier,
+             position.cost, position.average_cost, position.fees, position.realized,
+             position.unmatched_quantity)
+            for (account, security, details), position in self.positions.items()
+        ]
+        return pd.DataFrame(rows, columns=[
+            'account', 'security', 'details', 'quantity', 'multiplier',
+            'cost', 'average_cost', 'fees', 'realized', 'unmatched_quantity'
+        ])
+
+
+def _column(df, name, default, dtype=object):
+    if name not in df.columns:
+        return np.full(len(df), default, dtype=dtype)
+    values = df[name]
+    if dtype is object:
+        values = values.fillna(default)
+    return values.to_numpy(dtype=dtype)
+
+
+def has_quantities(df):
+    """Whether every trade in the frame has a known quantity"""
+    return len(df) > 0 and 'quantity' in df.columns and bool(df['quantity'].notna().all())
+
+
+def calculate_lot_pnl(df, method=FIFO):
+    """Quantity-aware realized profit/loss, in the same shape as calculate_realized_pnl"""
+    book = PositionBook(method)
+    realized = book.apply_frame(df)
+    trades = df.assign(realized_pl=realized)
+    by_security = (
+        pd.Series(np.nan_to_num(realized), index=pd.Index(df['security'], name='security'))
+        .groupby(level=0, sort=False).sum()
+    )
+    return RealizedPnL(by_security=by_security, trades=trades)
+
+
+def realized_pnl(df):
+    """Match share quantities when every trade has one, dollar amounts otherwise"""
+    return calculate_lot_pnl(df) if has_quantities(df) else calculate_realized_pnl(df)
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import re
+import threading
+
+import pandas as pd
+
+# File extensions read from the cache directory, in order of preference
+EXTENSIONS = ('.parquet', '.csv')
+
+
+def symbol_filename(symbol):
+    """File name stem for a symbol, e.g. 'CRNT Dec 19 $10 Call' -> 'CRNT_Dec_19_10_Call'"""
+    return re.sub(r'[^A-Za-z0-9.\-]+', '_', symbol.replace('$', '')).strip('_')
+
+
+class PriceCache:
+    """Daily closing prices kept on local disk, one file per symbol.
+
+    Each file has a date and a close column and can be written ahead of
+    time by any offline job, as <symbol>.csv or <symbol>.parquet (Parquet
+    needs pyarrow). Option series use the ticker followed by the details,
+    as shown in the ledger. Nothing is ever fetched from the network.
+    """
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = os.environ.get('PRICE_CACHE_DIR', os.path.join('data', 'prices'))
+        self.directory = directory
+        self._lock = threading.Lock()
+        # Parsed series keyed by symbol, with the file state they were read from
+        self._series = {}
+
+    def _path(self, symbol):
+        stem = os.path.join(self.directory, symbol_filename(symbol))
+        for extension in EXTENSIONS:
+            if os.path.exists(stem + extension):
+                return stem + extension
+        return None
+
+    def _read(self, path):
+        if path.endswith('.parquet'):
+            frame = pd.read_parquet(path, columns=['date', 'close'])
+        else:
+            frame = pd.read_csv(path, usecols=['date', 'close'])
+        series = pd.Series(
+            pd.to_numeric(frame['close'], errors='coerce').to_numpy(),
+            index=pd.DatetimeIndex(pd.to_datetime(frame['date'], format='ISO8601'), name='date')
+        )
+        series = series[~series.index.duplicated(keep='last')].sort_index()
+        return series.dropna()
+
+    def closes(self, symbol):
+        """Closing prices of one symbol indexed by date, or None if it is not cached"""
+        path = self._path(symbol)
+        if path is None:
+            return None
+
+        stat = os.stat(path)
+        state = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._series.get(symbol)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+
+        try:
+            series = self._read(path)
+        except Exception as e:
+            print(f"Error reading prices for {symbol}: {str(e)}")
+            return None
+
+        with self._lock:
+            self._series[symbol] = (state, series)
+        return series
+
+    def close_matrix(self, symbols, dates):
+        """Closes for every symbol on every date, carried forward over non-trading days.
+
+        Returns a dates x symbols frame; symbols without cached prices are
+        all NaN.
+        """
+        dates = pd.DatetimeIndex(dates)
+        columns = {}
+        for symbol in symbols:
+            series = self.closes(symbol)
+            if series is None or series.empty:
+                continue
+            # Last close on or before each date
+            columns[symbol] = series.reindex(dates, method='ffill')
+        return pd.DataFrame(columns, index=dates).reindex(columns=list(symbols))
+
+    def put(self, symbol, closes):
+        """Merge closing prices (a Series indexed by date) into the symbol's CSV file"""
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self.closes(symbol)
+        closes = pd.Series(closes.to_numpy(dtype=float), index=pd.DatetimeIndex(pd.to_datetime(closes.index)))
+        if existing is not None:
+            closes = pd.concat([existing, closes])
+            closes = closes[~closes.index.duplicated(keep='last')].sort_index()
+
+        stem = os.path.join(self.directory, symbol_filename(symbol))
+        frame = pd.DataFrame({'date': closes.index.strftime('%Y-%m-%d'), 'close': closes.to_numpy()})
+        with self._lock:
+            frame.to_csv(stem + '.csv', index=False)
+            # The merged prices now live in the CSV file
+            if os.path.exists(stem + '.parquet'):
+                os.remove(stem + '.parquet')
+            self._series.pop(symbol, None)
+
+    def version(self):
+        """Hash of the cached files' names and modification times, changes whenever prices do"""
+        digest = hashlib.sha256(self.directory.encode())
+        try:
+            entries = sorted(os.scandir(self.directory), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return digest.hexdigest()
+        for entry in entries:
+            if entry.name.endswith(EXTENSIONS):
+                stat = entry.stat()
+                digest.update(f"{entry.name}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+        return digest.hexdigest()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_price_cache():
+    """Process-wide PriceCache shared by every page and session"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PriceCache()
+        return _default_cache
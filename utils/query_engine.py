@@ -0,0 +1,187 @@
+import re
+
+import pandas as pd
+
+from utils.chat_context import MONTHS, parse_question_filters
+from utils.instrumentation import timed
+from utils.positions import realized_pnl
+
+# Questions that want judgement rather than a number go to the LLM
+OPEN_ENDED_RE = re.compile(r'\b(why|should|recommend\w*|advice|advise|suggest\w*|analy\w*|explain|opinion|risk\w*|strategy|predict\w*)\b')
+
+BEST_WORST_RE = re.compile(r'\b(best|top|biggest|worst)\b.*\b(perform\w*|gainers?|winners?|losers?|stocks?|securit\w*|tickers?)\b')
+SECURITIES_COUNT_RE = re.compile(r'\bhow many\b.*\b(securities|stocks|tickers|positions|companies|symbols)\b')
+TRADE_COUNT_RE = re.compile(r'\b(how many|number of|count of)\b.*\b(trades|transactions|orders|buys|sells|purchases|sales)\b')
+PNL_RE = re.compile(r'\b(realized|p&l|p/l|pnl|profit|profits|loss|losses|gains?|made|make|lose|lost|earn\w*)\b')
+INVESTED_RE = re.compile(r'\bhow much\b.*\b(invest\w*|spen[dt]|buy|bought|put in|purchas\w*)\b')
+SOLD_RE = re.compile(r'\bhow much\b.*\b(sell|sold|receive[d]?|proceeds|got back)\b')
+
+# Upper-case words in questions that are not tickers
+NON_TICKER_WORDS = {'I', 'P', 'L', 'PL', 'PNL', 'CAD', 'USD', 'TFSA', 'RRSP', 'FHSA', 'RESP', 'FIFO', 'ACB', 'ETF', 'YTD', 'AI'}
+TICKER_WORD_RE = re.compile(r'\b[A-Z][A-Z0-9.]{1,5}\b')
+
+# Words after these name what a question is about ("spent on tesla", "profit in my tfsa")
+ENTITY_PREPOSITIONS = {'on', 'in', 'into', 'for', 'of', 'from', 'with', 'about', 'at'}
+# Words that can stand between such a preposition and the entity, or mean "everything"
+SCOPE_WORDS = {
+    'my', 'the', 'a', 'an', 'all', 'any', 'each', 'every', 'total', 'overall', 'it', 'them', 'those', 'these',
+    'stock', 'stocks', 'share', 'shares', 'securities', 'positions', 'portfolio', 'tickers', 'different',
+    'trades', 'transactions', 'orders', 'buys', 'sells', 'purchases', 'sales',
+}
+TIME_WORDS = {'last', 'this', 'past', 'week', 'month', 'year', 'today'} | set(MONTHS)
+QUESTION_WORD_RE = re.compile(r"[\w&'.\-]+")
+
+
+def _money(value):
+    sign = '-' if value < 0 else ''
+    return f"{sign}${abs(value):,.2f}"
+
+
+class QueryEngine:
+    """Answers numeric portfolio questions directly from the ledger.
+
+    Recognized shapes (amount invested or sold, realized P&L, trade and
+    security counts, best/worst performer) are answered with vectorized
+    pandas aggregations over the rows the question refers to. answer()
+    returns None for anything else, including questions naming something
+    that is not a traded ticker or a date, so the caller can fall back to
+    the LLM.
+    """
+
+    def __init__(self, transactions_df, today=None):
+        self.today = today
+        self.df = transactions_df.assign(date=pd.to_datetime(transactions_df['date']))
+        pnl = realized_pnl(self.df)
+        self.security_pl = pnl.by_security
+        self.trade_pl = pnl.trades['realized_pl']
+        self.securities = self.df['security'].dropna().unique()
+
+    def memory_usage(self, deep=True):
+        """Approximate bytes held: the frame and the realized P&L series"""
+        return int(
+            self.df.memory_usage(deep=deep).sum()
+            + self.security_pl.memory_usage(deep=deep)
+            + self.trade_pl.memory_usage(deep=deep)
+        )
+
+    @timed('query_engine.answer')
+    def answer(self, question):
+        """Exact answer for a recognized question, or None"""
+        lowered = question.lower()
+        if OPEN_ENDED_RE.search(lowered):
+            return None
+
+        filters = parse_question_filters(question, self.securities, today=self.today)
+
+        # A ticker we have never traded: let the LLM explain rather than answer for everything
+        known = {str(security).upper() for security in self.securities}
+        for word in TICKER_WORD_RE.findall(question):
+            if word not in known and word not in NON_TICKER_WORDS:
+                return None
+        # Same for names we cannot resolve ("tesla", "my tfsa"): answering for everything would be wrong
+        if self._unresolved_entity(lowered, known) is not None:
+            return None
+
+        if BEST_WORST_RE.search(lowered):
+            return self._best_worst(lowered, filters)
+        if SECURITIES_COUNT_RE.search(lowered):
+            return self._securities_count(filters)
+        if TRADE_COUNT_RE.search(lowered):
+            return self._trade_count(lowered, filters)
+        if PNL_RE.search(lowered):
+            return self._realized_pl(filters)
+        if INVESTED_RE.search(lowered):
+            return self._total(filters, 'BUY')
+        if SOLD_RE.search(lowered):
+            return self._total(filters, 'SELL')
+        return None
+
+    def _unresolved_entity(self, lowered, known):
+        """First word naming what the question is about that is neither a traded ticker nor a date, or None"""
+        words = [word.strip(".'-") for word in QUESTION_WORD_RE.findall(lowered)]
+        for index, word in enumerate(words):
+            if word not in ENTITY_PREPOSITIONS:
+                continue
+            expecting = True
+            for candidate in words[index + 1:]:
+                if candidate in SCOPE_WORDS:
+                    continue
+                if candidate in ('and', 'or'):
+                    expecting = True
+                    continue
+                if not expecting:
+                    break
+                if not (candidate[:1].isdigit() or candidate in TIME_WORDS or candidate.upper() in known):
+                    return candidate
+                expecting = False
+        return None
+
+    def _mask(self, filters, transaction_type=None):
+        df = self.df
+        mask = pd.Series(True, index=df.index)
+        if filters['securities']:
+            mask &= df['security'].isin(filters['securities'])
+        if filters['start'] is not None:
+            mask &= df['date'].between(filters['start'], filters['end'])
+        if transaction_type:
+            mask &= df['transaction_type'] == transaction_type
+        return mask
+
+    def _scope(self, filters):
+        """Human-readable description of the securities and dates a question covers"""
+        parts = []
+        if filters['securities']:
+            parts.append("in " + ", ".join(filters['securities']))
+        if filters['start'] is not None:
+            parts.append(f"between {filters['start']:%Y-%m-%d} and {filters['end']:%Y-%m-%d}")
+        return (" " + " ".join(parts)) if parts else ""
+
+    def _total(self, filters, transaction_type):
+        mask = self._mask(filters, transaction_type)
+        total = self.df.loc[mask, 'amount'].abs().sum()
+        count = int(mask.sum())
+        verb = "invested" if transaction_type == 'BUY' else "sold"
+        noun = "buy" if transaction_type == 'BUY' else "sell"
+        return f"You {verb} {_money(total)}{self._scope(filters)} across {count} {noun} order{'s' if count != 1 else ''}."
+
+    def _realized_pl(self, filters):
+        mask = self._mask(filters, 'SELL')
+        total = self.trade_pl[mask].sum()
+        count = int(mask.sum())
+        outcome = "profit" if total >= 0 else "loss"
+        return (
+            f"Your realized {outcome}{self._scope(filters)} is {_money(total)} (FIFO) "
+            f"from {count} sell order{'s' if count != 1 else ''}."
+        )
+
+    def _trade_count(self, lowered, filters):
+        transaction_type = filters['transaction_type']
+        if re.search(r'\b(buys|purchases)\b', lowered):
+            transaction_type = 'BUY'
+        elif re.search(r'\b(sells|sales)\b', lowered):
+            transaction_type = 'SELL'
+        mask = self._mask(filters, transaction_type)
+        count = int(mask.sum())
+        noun = {'BUY': 'buy order', 'SELL': 'sell order'}.get(transaction_type, 'trade')
+        return f"You made {count} {noun}{'s' if count != 1 else ''}{self._scope(filters)}."
+
+    def _securities_count(self, filters):
+        count = int(self.df.loc[self._mask(filters), 'security'].nunique())
+        return f"You traded {count} different securit{'ies' if count != 1 else 'y'}{self._scope(filters)}."
+
+    def _best_worst(self, lowered, filters):
+        mask = self._mask(filters, 'SELL')
+        if filters['start'] is not None or filters['securities']:
+            security_pl = self.trade_pl[mask].groupby(self.df.loc[mask, 'security']).sum()
+        else:
+            security_pl = self.security_pl
+        if security_pl.empty:
+            return f"You have no realized profit or loss{self._scope(filters)} yet."
+
+        worst = re.search(r'\b(worst|losers?)\b', lowered) is not None
+        ranked = security_pl.sort_values(ascending=worst).head(3)
+        label = "worst" if worst else "best"
+        lines = [f"Your {label} performers by realized P&L (FIFO){self._scope(filters)}:"]
+        for rank, (security, value) in enumerate(ranked.items(), start=1):
+            lines.append(f"{rank}. {security}: {_money(value)}")
+        return "\n".join(lines)
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_prompt(text):
+    """Case, whitespace and trailing-punctuation insensitive form of a question"""
+    return re.sub(r'\s+', ' ', text).strip().lower().rstrip('?!. ')
+
+
+class ResponseCache:
+    """Process-wide LRU cache of model responses with a time-to-live.
+
+    Keys combine the ledger fingerprint with the normalized prompt and the
+    model parameters, so a changed ledger never hits stale answers.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(ledger_fingerprint, kind, prompt, **params):
+        payload = json.dumps(
+            [ledger_fingerprint, kind, normalize_prompt(prompt), params],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Shared ResponseCache, sized by RESPONSE_CACHE_SIZE and RESPONSE_CACHE_TTL"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', 512)),
+                ttl=float(os.environ.get('RESPONSE_CACHE_TTL', 3600)),
+            )
+        return _cache
@@ -0,0 +1,60 @@
+# Column layout of the transaction ledger. Kept free of heavy imports so
+# modules that only need the layout (like the ledger store) load fast.
+
+COLUMNS = ['date', 'security', 'transaction_type', 'amount']
+# Lot details, only known for sources that include them (the CSV export)
+LOT_COLUMNS = ['account', 'details', 'quantity', 'fees']
+LEDGER_COLUMNS = COLUMNS + LOT_COLUMNS
+
+SIDES = ['BUY', 'SELL']
+# Repetitive text columns, stored as categoricals: each distinct value once plus a small code per row
+CATEGORY_COLUMNS = ['security', 'account', 'details']
+FLOAT_COLUMNS = ['amount', 'quantity', 'fees']
+
+
+def to_ledger_frame(df):
+    """Convert the ledger columns present in df to the canonical in-memory dtypes.
+
+    Dates become datetime64, tickers, accounts and details categoricals,
+    transaction_type a categorical over SIDES (int8 codes) and amounts,
+    quantities and fees float64. Missing accounts and details become ''
+    and missing fees 0, like the ledger store. Other columns are left alone.
+    """
+    import pandas as pd
+
+    converted = {}
+    if 'date' in df.columns:
+        dates = df['date']
+        if dates.dtype.kind != 'M':
+            dates = pd.to_datetime(dates.astype(str), format='ISO8601')
+        converted['date'] = dates.astype('datetime64[ns]')
+
+    if 'transaction_type' in df.columns:
+        sides = df['transaction_type']
+        if not (isinstance(sides.dtype, pd.CategoricalDtype) and list(sides.cat.categories) == SIDES):
+            sides = pd.Categorical(sides.astype(str).str.upper(), categories=SIDES)
+        converted['transaction_type'] = sides
+
+    for column in CATEGORY_COLUMNS:
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if column != 'security':
+            values = values.astype(object).fillna('') if values.isna().any() else values
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        converted[column] = values
+
+    for column in FLOAT_COLUMNS:
+        if column in df.columns:
+            values = pd.to_numeric(df[column], errors='coerce').astype(float)
+            converted[column] = values.fillna(0.0) if column == 'fees' else values
+
+    return df.assign(**converted)
+
+
+def day_strings(dates):
+    """YYYY-MM-DD strings for a date column, whether it holds datetime64 values or text"""
+    if dates.dtype.kind == 'M':
+        return dates.to_numpy().astype('datetime64[D]').astype(str)
+    return dates.astype(str).str[:10].to_numpy()
@@ -0,0 +1,77 @@
+import uuid
+
+import streamlit as st
+
+from utils.ledger_store import get_ledger_store
+from utils.session_store import get_session_store
+
+
+def current_ledger_id():
+    """Ledger id for this session.
+
+    A ?ledger= query parameter picks a saved ledger explicitly. Otherwise
+    the session gets a new random id, which is put in the URL so a reload
+    or bookmark comes back to the same ledger. Sessions never fall back to
+    a shared id, so nobody sees another user's transactions.
+    """
+    if 'ledger_id' not in st.session_state:
+        ledger_id = st.query_params.get('ledger')
+        if not ledger_id:
+            ledger_id = uuid.uuid4().hex
+            st.query_params['ledger'] = ledger_id
+        st.session_state.ledger_id = ledger_id
+    return st.session_state.ledger_id
+
+
+def session_key():
+    """Key of this browser session's data in the session data store"""
+    if 'session_key' not in st.session_state:
+        st.session_state.session_key = uuid.uuid4().hex
+    return st.session_state.session_key
+
+
+def get_session_data(name, default=None):
+    """Value kept for this session in the session data store, reloaded from disk if it was spilled"""
+    return get_session_store().get(session_key(), name, default)
+
+
+def set_session_data(name, value, spill=True):
+    """Keep a value for this session; spill=False for caches that can simply be rebuilt"""
+    get_session_store().set(session_key(), name, value, spill)
+
+
+def get_session_ledger():
+    """The ledger published for this session, or None"""
+    return get_session_data('ledger')
+
+
+def set_session_ledger(ledger):
+    """Publish a ledger to the session, for the dashboard and chat pages"""
+    # Only the small flags stay in st.session_state; the ledger itself can be spilled when idle
+    set_session_data('ledger', ledger)
+    st.session_state.data_processed = True
+    st.session_state.data_confirmed = True
+
+
+def load_session_ledger():
+    """The session's ledger, loading the persisted one if nothing is loaded yet"""
+    ledger = get_session_ledger()
+    if ledger is not None:
+        return ledger
+
+    # Cheap check first, so pages without saved data never load pandas
+    store = get_ledger_store()
+    ledger_id = current_ledger_id()
+    version = store.ledger_version(ledger_id)
+    if version is None:
+        st.session_state.data_processed = False
+        st.session_state.data_confirmed = False
+        return None
+
+    # The user's other sessions on the same saved ledger share one copy
+    ledger = get_session_store().shared_ledger(ledger_id, version) or store.load_ledger(ledger_id)
+    if len(ledger) == 0:
+        return None
+
+    set_session_ledger(ledger)
+    return ledger
@@ -0,0 +1,326 @@
+import os
+import pickle
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import NamedTuple
+
+
+def estimate_bytes(value):
+    """Rough in-memory size of a session value"""
+    if hasattr(value, 'memory_usage'):
+        # DataFrames, Series, Ledgers and the chat's context builder and query engine
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_bytes(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class _SavedLedger(NamedTuple):
+    """Written in place of a ledger saved in the LedgerStore, which it is reloaded from"""
+    ledger_id: str
+    version: str
+
+
+def _sweep_periodically(store_ref, interval, stopped):
+    # Holds only a weak reference, so an unused store can still be collected
+    while not stopped.wait(interval):
+        store = store_ref()
+        if store is None:
+            return
+        store.sweep()
+        del store
+
+
+class _Entry:
+    """Values of one session; spillable ones can be written to disk, the others are just dropped"""
+
+    def __init__(self):
+        self.values = {}
+        self.spillable = {}
+        # Spillable values changed since they were last written
+        self.dirty = set()
+        self.accessed = time.time()
+        # Set while the session is being written to disk; any use of the session clears it
+        self.spilling = None
+
+
+class SessionDataStore:
+    """Per-session data kept in memory under a global byte budget, spilling to disk.
+
+    Streamlit sessions keep only their key in st.session_state; the data
+    itself (ledgers, chat histories, derived caches) lives here. Sessions
+    idle for more than idle_seconds, and the least recently used ones
+    once the hot data exceeds max_bytes, are evicted: spillable values
+    are pickled to directory and reloaded on the next get(), the others
+    are dropped and rebuilt by their owner. Idle sessions are also swept
+    every sweep_interval seconds, so a quiet server still frees them.
+    Spilled files are deleted after disk_ttl seconds, since sessions end
+    without notice.
+
+    Ledgers saved in the ledger store are not pickled: only their id and
+    version are written, and they are reloaded from the store. Sessions
+    on the same ledger id and version share one object, counted once
+    against the budget. Ledger ids are private to a user (see
+    current_ledger_id), so only that user's sessions share a ledger.
+    """
+
+    def __init__(self, directory=None, max_bytes=512 * 1024 * 1024, idle_seconds=600, disk_ttl=7 * 24 * 3600,
+                 sweep_interval=60, ledger_store=None):
+        if directory is None:
+            directory = os.environ.get('SESSION_SPILL_DIR', os.path.join('data', 'sessions'))
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.disk_ttl = disk_ttl
+        self._ledger_store = ledger_store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._shared_ledgers = weakref.WeakValueDictionary()
+        # Running total of the hot bytes, counting shared values once: id(value) -> [references, bytes]
+        self._hot_refs = {}
+        self._hot_total = 0
+        self._last_prune = 0.0
+
+        if sweep_interval:
+            stopped = threading.Event()
+            weakref.finalize(self, stopped.set)
+            threading.Thread(
+                target=_sweep_periodically, args=(weakref.ref(self), sweep_interval, stopped),
+                name='session-sweep', daemon=True
+            ).start()
+
+    def _path(self, session_id, name):
+        return os.path.join(self.directory, f"{session_id}.{name}.pkl")
+
+    def get(self, session_id, name, default=None):
+        """Value stored for this session, reloading it from disk if it was spilled"""
+        with self._lock:
+            entry = self._touch(session_id)
+            if name in entry.values:
+                return entry.values[name]
+
+        # Reloading can take a while, so other sessions are not kept waiting meanwhile
+        value = self._reload(session_id, name)
+        if value is None:
+            return default
+
+        with self._lock:
+            entry = self._touch(session_id)
+            if name in entry.values:
+                # Set by another run of this session meanwhile
+                return entry.values[name]
+            value = self._store(entry, name, value, spill=True)
+            victims = self._evict(keep=session_id)
+        self._spill(victims)
+        return value
+
+    def set(self, session_id, name, value, spill=True):
+        """Store a value for this session; with spill=False it is dropped rather than written on eviction"""
+        with self._lock:
+            entry = self._touch(session_id)
+            self._store(entry, name, value, spill)
+            if spill:
+                entry.dirty.add(name)
+            victims = self._evict(keep=session_id)
+        self._spill(victims)
+
+    def shared_ledger(self, ledger_id, version):
+        """A ledger with this id and version already held by some session, if any"""
+        with self._lock:
+            return self._shared_ledgers.get((ledger_id, version))
+
+    def memory_usage(self):
+        """Estimated bytes held in memory, counting shared values once"""
+        with self._lock:
+            return self._hot_total
+
+    def sweep(self):
+        """Spill sessions idle for more than idle_seconds; run periodically in the background"""
+        with self._lock:
+            victims = self._evict(keep=None)
+        self._spill(victims)
+
+    def _reload(self, session_id, name):
+        path = self._path(session_id, name)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reloading session data {name}: {str(e)}")
+            return None
+
+        if isinstance(value, _SavedLedger):
+            value = self._load_saved_ledger(value)
+        return value
+
+    def _load_saved_ledger(self, saved):
+        """The ledger a session had spilled, shared if another session holds it, else from the ledger store"""
+        with self._lock:
+            shared = self._shared_ledgers.get((saved.ledger_id, saved.version))
+        if shared is not None:
+            return shared
+        if self._ledger_store is None:
+            from utils.ledger_store import get_ledger_store
+            self._ledger_store = get_ledger_store()
+        # Appended to from another tab meanwhile: the latest saved version is what the user expects
+        if self._ledger_store.ledger_version(saved.ledger_id) is None:
+            return None
+        return self._ledger_store.load_ledger(saved.ledger_id)
+
+    def _share(self, value):
+        # Only ledgers saved in the ledger store are shared, keyed by their id and version
+        ledger_id = getattr(value, 'ledger_id', None)
+        version = getattr(value, 'version', None)
+        if ledger_id is None or version is None:
+            return value
+        shared = self._shared_ledgers.get((ledger_id, version))
+        if shared is not None:
+            return shared
+        self._shared_ledgers[(ledger_id, version)] = value
+        return value
+
+    def _store(self, entry, name, value, spill):
+        value = self._share(value)
+        if name in entry.values:
+            self._release(entry.values[name])
+        entry.values[name] = value
+        entry.spillable[name] = spill
+        self._hold(value)
+        return value
+
+    def _hold(self, value):
+        refs = self._hot_refs.get(id(value))
+        if refs is not None:
+            refs[0] += 1
+            return
+        size = estimate_bytes(value)
+        self._hot_refs[id(value)] = [1, size]
+        self._hot_total += size
+
+    def _release(self, value):
+        refs = self._hot_refs[id(value)]
+        refs[0] -= 1
+        if refs[0] == 0:
+            del self._hot_refs[id(value)]
+            self._hot_total -= refs[1]
+
+    def _touch(self, session_id):
+        entry = self._entries.get(session_id)
+        if entry is None:
+            entry = self._entries[session_id] = _Entry()
+        entry.accessed = time.time()
+        entry.spilling = None
+        self._entries.move_to_end(session_id)
+        return entry
+
+    def _freed_bytes(self, entry, released):
+        # Bytes freed once this entry is dropped, given the references already released
+        freed = 0
+        for value in entry.values.values():
+            released[id(value)] = released.get(id(value), 0) + 1
+            references, size = self._hot_refs[id(value)]
+            if released[id(value)] == references:
+                freed += size
+        return freed
+
+    def _evict(self, keep):
+        """Mark idle sessions, then the least recently used ones while over budget, for _spill"""
+        now = time.time()
+        released = {}
+        hot = self._hot_total
+        for entry in self._entries.values():
+            if entry.spilling is not None:
+                hot -= self._freed_bytes(entry, released)
+
+        victims = []
+        for session_id, entry in self._entries.items():
+            if session_id == keep or entry.spilling is not None:
+                continue
+            # Least recently used first, so idle sessions come before any that are not
+            if now - entry.accessed <= self.idle_seconds and hot <= self.max_bytes:
+                break
+            hot -= self._freed_bytes(entry, released)
+            entry.spilling = object()
+            values = [(name, value, name in entry.dirty) for name, value in entry.values.items()
+                      if entry.spillable[name]]
+            victims.append((session_id, entry, entry.spilling, values))
+        return victims
+
+    def _spill(self, victims):
+        """Write the marked sessions to disk outside the lock, dropping each once all its values are written"""
+        for session_id, entry, spilling, values in victims:
+            written = set()
+            for name, value, dirty in values:
+                path = self._path(session_id, name)
+                # Unchanged values reloaded from disk are still there, unless pruned meanwhile
+                if not dirty and os.path.exists(path):
+                    written.add(name)
+                    continue
+                if getattr(value, 'ledger_id', None) is not None:
+                    # Already saved in the ledger store, however many sessions hold it
+                    value = _SavedLedger(value.ledger_id, value.version)
+                try:
+                    # Write then rename, so a crash never leaves a half-written file behind
+                    with open(path + '.tmp', 'wb') as f:
+                        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    os.replace(path + '.tmp', path)
+                except Exception as e:
+                    print(f"Error spilling session data {name}: {str(e)}")
+                    break
+                written.add(name)
+
+            with self._lock:
+                for name, value, dirty in values:
+                    if name in written and entry.values.get(name) is value:
+                        entry.dirty.discard(name)
+                if entry.spilling is not spilling:
+                    # Used meanwhile, so it stays in memory
+                    continue
+                if len(written) < len(values):
+                    # Kept in memory rather than losing what could not be written
+                    entry.spilling = None
+                    continue
+                del self._entries[session_id]
+                for value in entry.values.values():
+                    self._release(value)
+
+        now = time.time()
+        with self._lock:
+            if now - self._last_prune <= 3600:
+                return
+            self._last_prune = now
+        self._prune_disk(now)
+
+    def _prune_disk(self, now):
+        for dir_entry in os.scandir(self.directory):
+            try:
+                if now - dir_entry.stat().st_mtime > self.disk_ttl:
+                    os.remove(dir_entry.path)
+            except OSError:
+                # Removed concurrently by another process
+                pass
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Process-wide SessionDataStore, sized by SESSION_MEMORY_BUDGET (bytes) and SESSION_IDLE_SECONDS"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SessionDataStore(
+                max_bytes=int(os.environ.get('SESSION_MEMORY_BUDGET', 512 * 1024 * 1024)),
+                idle_seconds=float(os.environ.get('SESSION_IDLE_SECONDS', 600)),
+            )
+        return _default_store
@@ -0,0 +1,113 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import timed
+from utils.positions import EPSILON, FIFO, PositionBook, has_quantities
+
+
+class Valuation(NamedTuple):
+    """Daily market value of the portfolio and the breakdown on its last day."""
+    daily: pd.DataFrame
+    contribution: pd.DataFrame
+    unpriced: list
+
+
+def instrument_names(df):
+    """Price cache symbol of each trade: the ticker, followed by the details for options"""
+    if 'details' not in df.columns:
+        return df['security'].astype(str)
+    return (df['security'].astype(str) + ' ' + df['details'].fillna('').astype(str)).str.strip()
+
+
+def holdings_matrix(df, method=FIFO, end=None, changes=None):
+    """Open units and open cost of every instrument on every calendar day.
+
+    Each trade's change in open quantity and cost (from a PositionBook
+    replay, unless precomputed changes are given) is scattered into a
+    day x instrument grid, which is then cumulatively summed down the
+    days. Returns the calendar, the instruments, and the units and cost
+    arrays of shape (days, instruments).
+    """
+    if changes is None:
+        _, unit_changes, cost_changes = PositionBook(method).apply_frame_with_changes(df)
+    else:
+        unit_changes, cost_changes = changes
+
+    dates = pd.to_datetime(df['date']).dt.normalize()
+    start = dates.min()
+    end = dates.max() if end is None else max(dates.max(), pd.Timestamp(end))
+    calendar = pd.date_range(start, end, freq='D')
+    days = (dates - start).dt.days.to_numpy()
+    codes, instruments = pd.factorize(instrument_names(df))
+
+    units = np.zeros((len(calendar), len(instruments)))
+    cost = np.zeros((len(calendar), len(instruments)))
+    np.add.at(units, (days, codes), unit_changes)
+    np.add.at(cost, (days, codes), cost_changes)
+    np.cumsum(units, axis=0, out=units)
+    np.cumsum(cost, axis=0, out=cost)
+
+    # Closed positions can keep rounding residue from the running sums
+    closed = np.abs(units) < EPSILON
+    units[closed] = 0.0
+    cost[closed] = 0.0
+    return calendar, pd.Index(instruments), units, cost
+
+
+@timed('valuation.daily_valuation')
+def daily_valuation(df, price_cache, method=FIFO, end=None, changes=None):
+    """Market value, cost basis and unrealized P&L of the open positions on every day.
+
+    Closes come from the local price cache and are assumed to be in CAD,
+    like the ledger amounts. Instruments without cached closes are left
+    out of the totals and listed in unpriced. The days run to end, or to
+    the latest cached close when no end is given. changes are each
+    trade's (units, cost) changes when already known, see holdings_matrix.
+    Returns None when the ledger has no share quantities to value.
+    """
+    if not has_quantities(df):
+        return None
+
+    if end is None:
+        # Value up to the latest cached close, even if it is after the last trade
+        latest = [
+            closes.index[-1]
+            for closes in (price_cache.closes(symbol) for symbol in instrument_names(df).unique())
+            if closes is not None and not closes.empty
+        ]
+        end = max(latest) if latest else None
+    calendar, instruments, units, cost = holdings_matrix(df, method, end, changes)
+
+    closes = price_cache.close_matrix(instruments, calendar).to_numpy(dtype=float)
+    priced = ~np.isnan(closes)
+    values = np.where(priced, units * np.nan_to_num(closes), 0.0)
+    priced_cost = np.where(priced, cost, 0.0)
+
+    market_value = values.sum(axis=1)
+    cost_basis = priced_cost.sum(axis=1)
+    daily = pd.DataFrame({
+        'date': calendar,
+        'market_value': market_value,
+        'cost_basis': cost_basis,
+        'unrealized_pl': market_value - cost_basis,
+    })
+
+    held = units[-1] > EPSILON
+    contribution = pd.DataFrame({
+        'units': units[-1],
+        'close': closes[-1],
+        'market_value': units[-1] * closes[-1],
+        'cost_basis': cost[-1],
+    }, index=pd.Index(instruments, name='security'))[held]
+    contribution['unrealized_pl'] = contribution['market_value'] - contribution['cost_basis']
+    total_value = contribution['market_value'].sum()
+    contribution['weight'] = contribution['market_value'] / total_value if total_value else np.nan
+    unpriced = contribution.index[contribution['close'].isna()].tolist()
+
+    return Valuation(
+        daily=daily,
+        contribution=contribution.sort_values('market_value', ascending=False),
+        unpriced=unpriced,
+    )